@@ -0,0 +1,283 @@
+'''
+Psychometric curves of the single-ensemble task
+#
+Loads every data/*_ep_experiment.csv file and fits a psychometric function
+(cumulative Gaussian or logistic) of p('j' = clockwise) over the judged
+orientation per subject x condition: the cued orientation in condition
+1 & 4, the set orientation in condition 2 & 3 (see scoring.py).
+The sessions of a subject are taken together.
+#
+Every file is reduced to counts of trials & 'j' responses per condition
+and orientation, and fitted per session, in a pool of processes. The
+result is cached under the SHA-256 of the file contents (cache_dir), so
+after a new session only that file is read again:
+python analysis.py --data data --function gaussian --out fits.csv
+#
+The fit is a maximum likelihood grid search (no SciPy needed):
+p('j') = lapse / 2 + (1 - lapse) * F((orientation - pse) / width)
+pse = point of subjective equality (deg), jnd = 75% point - pse (deg)
+'''
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import glob
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from scoring import target_orientation
+
+functions = ('gaussian', 'logistic')
+fit_columns = ['Sub_Name', 'Condition', 'Function', 'PSE', 'Width', 'JND',
+               'Log_Likelihood', 'Trials', 'Sessions']
+cache_version = 1  # change when the counts or the fit change
+
+_pse_grid = np.arange(-40, 41, 1.0)
+_width_grid = np.exp(np.linspace(np.log(0.5), np.log(60), 60))
+_width_step = np.log(60 / 0.5) / 59
+
+
+def _erf(x):
+    # Abramowitz & Stegun 7.1.26, max. error 1.5e-7
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    y = 1.0 - (((((1.061405429 * t - 1.453152027) * t) + 1.421413741) * t
+                - 0.284496736) * t + 0.254829592) * t * np.exp(-x * x)
+    return sign * y
+
+
+def psychometric(x, pse, width, function='gaussian', lapse=0.0):
+    # p('j') for orientations x
+    z = (np.asarray(x) - pse) / width
+    if function == 'gaussian':
+        p = 0.5 * (1.0 + _erf(z / np.sqrt(2.0)))
+    elif function == 'logistic':
+        p = 1.0 / (1.0 + np.exp(-z))
+    else:
+        raise ValueError("Unknown psychometric function: {} ({})"
+                         .format(function, ', '.join(functions)))
+    return lapse / 2.0 + (1.0 - lapse) * p
+
+
+def _log_likelihood(orientations, n, k, pse, width, function, lapse):
+    # pse & width are grids, the likelihood is summed over the last axis
+    p = psychometric(orientations, pse[..., None], width[..., None],
+                     function, lapse)
+    p = np.clip(p, 1e-9, 1 - 1e-9)
+    return (k * np.log(p) + (n - k) * np.log(1 - p)).sum(axis=-1)
+
+
+def fit(orientations, n, k, function='gaussian', lapse=0.0):
+    '''
+    Maximum likelihood fit to n trials with k 'j' responses per orientation,
+    a coarse grid followed by 2 grids 10x finer around the best point
+    return dict of pse, width, jnd & log_likelihood
+    '''
+    orientations = np.asarray(orientations, dtype=float)
+    n = np.asarray(n, dtype=float)
+    k = np.asarray(k, dtype=float)
+    pse_grid, width_grid = _pse_grid, _width_grid
+    pse_step, width_step = 1.0, _width_step
+    for refine in range(3):
+        pse, width = np.meshgrid(pse_grid, width_grid, indexing='ij')
+        log_likelihood = _log_likelihood(orientations, n, k, pse, width,
+                                         function, lapse)
+        best = np.unravel_index(np.argmax(log_likelihood), pse.shape)
+        best_pse, best_width = pse[best], width[best]
+        pse_grid = best_pse + pse_step * np.linspace(-1, 1, 21)
+        width_grid = best_width * np.exp(width_step * np.linspace(-1, 1, 21))
+        pse_step, width_step = pse_step / 10, width_step / 10
+    # 75% point: z = 0.6745 (gaussian) or ln 3 (logistic)
+    jnd = best_width * (0.6745 if function == 'gaussian' else np.log(3))
+    return {'pse': float(best_pse), 'width': float(best_width),
+            'jnd': float(jnd),
+            'log_likelihood': float(log_likelihood[best])}
+
+
+def file_hash(file_name):
+    sha = hashlib.sha256()
+    with open(file_name, 'rb') as data_file:
+        for block in iter(lambda: data_file.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def session_counts(file_name):
+    '''
+    Read a data file, return the subject name and
+    {condition: [[orientation, trials, 'j' responses], ...]}
+    trials without an 'f' / 'j' response (e.g. 'end') are left out
+    '''
+    with open(file_name, newline='') as data_file:
+        rows = [row for row in csv.DictReader(data_file)
+                if row['Response'] in ('f', 'j')]
+    subject = rows[0]['Sub_Name'] if rows else ''
+    condition = np.array([int(row['Condition']) for row in rows])
+    target = target_orientation(
+        condition, np.array([int(row['Set_Orientation']) for row in rows]),
+        np.array([int(row['Cued_Orientation']) for row in rows]))
+    clockwise = np.array([row['Response'] == 'j' for row in rows])
+    counts = {}
+    for cond in np.unique(condition):
+        counts[int(cond)] = []
+        for ori in np.unique(target[condition == cond]):
+            trials = (condition == cond) & (target == ori)
+            counts[int(cond)].append([int(ori), int(trials.sum()),
+                                      int(clockwise[trials].sum())])
+    return subject, counts
+
+
+def fit_counts(counts, function='gaussian', lapse=0.0):
+    # fit every condition of {condition: [[orientation, n, k], ...]}
+    fits = {}
+    for cond, rows in counts.items():
+        orientations, n, k = np.array(rows, dtype=float).T
+        fits[cond] = fit(orientations, n, k, function, lapse)
+        fits[cond]['trials'] = int(n.sum())
+    return fits
+
+
+def analyse_file(file_name, digest, function, lapse, cache_dir):
+    # counts & session fits of 1 data file, cached by its hash
+    subject, counts = session_counts(file_name)
+    result = {'file': file_name, 'subject': subject, 'counts': counts,
+              'fits': fit_counts(counts, function, lapse)}
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, cache_name(digest, function,
+                                                        lapse))
+        with open(cache_file + '.tmp', 'w') as cache:
+            json.dump(result, cache)
+        os.replace(cache_file + '.tmp', cache_file)
+    return result
+
+
+def cache_name(digest, function, lapse):
+    return '{}_{}_{}_v{}.json'.format(digest, function, lapse,
+                                      cache_version)
+
+
+def load_cached(digest, function, lapse, cache_dir):
+    if not cache_dir:
+        return None
+    cache_file = os.path.join(cache_dir, cache_name(digest, function, lapse))
+    if not os.path.exists(cache_file):
+        return None
+    with open(cache_file) as cache:
+        result = json.load(cache)
+    # json keys are strings
+    for key in ('counts', 'fits'):
+        result[key] = {int(cond): value
+                       for cond, value in result[key].items()}
+    return result
+
+
+def analyse(files, function='gaussian', lapse=0.0,
+            cache_dir='data/.analysis_cache', jobs=None):
+    '''
+    Analyse the data files, the uncached ones in a pool of processes
+    return the list of per file results (subject, counts, session fits)
+    and the number of files read (not cached)
+    '''
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    results = {}
+    todo = []
+    for file_name in files:
+        digest = file_hash(file_name)
+        cached = load_cached(digest, function, lapse, cache_dir)
+        if cached is None:
+            todo.append((file_name, digest))
+        else:
+            cached['file'] = file_name
+            results[file_name] = cached
+    if len(todo) > 1 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(analyse_file, file_name, digest,
+                                   function, lapse, cache_dir)
+                       for file_name, digest in todo]
+            for future in futures:
+                result = future.result()
+                results[result['file']] = result
+    else:
+        for file_name, digest in todo:
+            results[file_name] = analyse_file(file_name, digest, function,
+                                              lapse, cache_dir)
+    return [results[file_name] for file_name in files], len(todo)
+
+
+def subject_fits(results, function='gaussian', lapse=0.0):
+    '''
+    Fit the summed counts of all sessions of every subject,
+    return the rows of the fit table (fit_columns)
+    '''
+    subjects = {}
+    for result in results:
+        subject = subjects.setdefault(result['subject'],
+                                      {'sessions': 0, 'counts': {}})
+        subject['sessions'] += 1
+        for cond, rows in result['counts'].items():
+            summed = subject['counts'].setdefault(cond, {})
+            for ori, n, k in rows:
+                total = summed.setdefault(ori, [0, 0])
+                total[0] += n
+                total[1] += k
+    table = []
+    for name in sorted(subjects):
+        counts = {cond: [[ori] + total for ori, total in sorted(rows.items())]
+                  for cond, rows in subjects[name]['counts'].items()}
+        fits = fit_counts(counts, function, lapse)
+        for cond in sorted(fits):
+            row = fits[cond]
+            table.append([name, cond, function, row['pse'], row['width'],
+                          row['jnd'], row['log_likelihood'], row['trials'],
+                          subjects[name]['sessions']])
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit psychometric curves per subject x condition")
+    parser.add_argument('--data', default='data',
+                        help="folder of the *_ep_experiment.csv files")
+    parser.add_argument('--function', choices=functions, default='gaussian')
+    parser.add_argument('--lapse', type=float, default=0.0,
+                        help="fixed lapse rate of the fits")
+    parser.add_argument('--cache', default=None,
+                        help="cache folder, default DATA/.analysis_cache, "
+                        "'' for no cache")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="number of processes, default all CPUs")
+    parser.add_argument('--out', default=None, help="csv file for the fits")
+    args = parser.parse_args()
+    cache_dir = os.path.join(args.data, '.analysis_cache') \
+        if args.cache is None else args.cache
+
+    start = time.perf_counter()
+    files = sorted(glob.glob(os.path.join(args.data,
+                                          '*_ep_experiment.csv')))
+    results, n_read = analyse(files, args.function, args.lapse, cache_dir,
+                              args.jobs)
+    table = subject_fits(results, args.function, args.lapse)
+    elapsed = time.perf_counter() - start
+    print("{} files ({} read, {} cached) in {:.2f} s".format(
+        len(files), n_read, len(files) - n_read, elapsed))
+
+    print("{:<16}{:>6}{:>10}{:>10}{:>8}".format('subject', 'cond', 'PSE',
+                                               'JND', 'trials'))
+    for row in table:
+        print("{:<16}{:>6}{:>10.2f}{:>10.2f}{:>8}".format(
+            row[0], row[1], row[3], row[5], row[7]))
+    if args.out:
+        with open(args.out, 'w', newline='') as fit_file:
+            writer = csv.writer(fit_file)
+            writer.writerow(fit_columns)
+            writer.writerows(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+'''
+Pluggable display backend for the experiment and practice scripts
+#
+The scripts import visual, event, monitors, core, logging, gui & keyboard
+(psychopy.hardware.keyboard) from here instead of from psychopy. The
+backend is chosen by the EP_BACKEND environment variable before the
+scripts are imported:
+psychopy = real window, dialogs and keyboard (default)
+null = offscreen stand-ins driven by a virtual clock and scripted
+responses, see null_backend.py (e.g. EP_BACKEND=null python ver2_experiment.py)
+#
+The modules are imported lazily: each name is a stand-in that imports
+the real module on its first use (e.g. visual.Window), so importing the
+scripts, the stimuli or the trial design does not start psychopy.
+'''
+
+import importlib
+import os
+
+backend_name = os.environ.get('EP_BACKEND', 'psychopy')
+
+
+class LazyModule:
+    '''
+    Module imported on the first attribute access
+    load = function returning the module
+    '''
+
+    def __init__(self, name, load):
+        self._name = name
+        self._load = load
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = self._load()
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        return '<lazy {} module {}>'.format(backend_name, self._name)
+
+
+def _psychopy(name):
+    return LazyModule(name, lambda: importlib.import_module(name))
+
+
+def _null(name):
+    return LazyModule(name, lambda: getattr(
+        importlib.import_module('null_backend'), name))
+
+
+if backend_name == 'psychopy':
+    visual = _psychopy('psychopy.visual')
+    event = _psychopy('psychopy.event')
+    monitors = _psychopy('psychopy.monitors')
+    core = _psychopy('psychopy.core')
+    logging = _psychopy('psychopy.logging')
+    gui = _psychopy('psychopy.gui')
+    keyboard = _psychopy('psychopy.hardware.keyboard')
+elif backend_name == 'null':
+    visual = _null('visual')
+    event = _null('event')
+    monitors = _null('monitors')
+    core = _null('core')
+    logging = _null('logging')
+    gui = _null('gui')
+    keyboard = _null('keyboard')
+else:
+    raise ValueError("Unknown EP_BACKEND: {} (psychopy or null)"
+                     .format(backend_name))
@@ -0,0 +1,71 @@
+'''
+Background disk writes of the session data
+#
+The trial rows, the telemetry records and the end of session files are
+handed to a single worker thread, which writes them while the ISI and the
+breaks are on the screen. The trial loop only puts a job in a queue, it
+never waits on the disk; the jobs run in the order they were submitted.
+#
+A failing job does not stop the others (e.g. a failing columnar file does
+not lose the flip log queued after it): the errors are collected, and
+the next submit(), drain() or close() prints every failed job and raises
+the first error in the trial loop, so a failing disk is not silently
+ignored.
+'''
+
+import queue
+import threading
+
+
+class IOWorker:
+    '''
+    Worker thread running the submitted write jobs in order
+    '''
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.errors = []  # (job name, error) of the failed jobs
+        self.closed = False
+        # daemon: a sys.exit() in a break must not wait for the thread,
+        # close() (registered with atexit) writes the remaining jobs
+        self.thread = threading.Thread(target=self._run, name='io_worker',
+                                       daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                function, args = job
+                function(*args)
+            except Exception as error:
+                self.errors.append((getattr(function, '__qualname__',
+                                            repr(function)), error))
+            finally:
+                self.jobs.task_done()
+
+    def _raise_error(self):
+        if self.errors:
+            errors, self.errors = self.errors, []
+            for name, error in errors:
+                print("I/O job {} failed: {!r}".format(name, error))
+            raise errors[0][1]
+
+    def submit(self, function, *args):
+        # queue function(*args), the arguments must not change afterwards
+        self._raise_error()
+        self.jobs.put((function, args))
+
+    def drain(self):
+        # wait until every submitted job is written
+        self.jobs.join()
+        self._raise_error()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.jobs.put(None)
+            self.thread.join()
+            self._raise_error()
@@ -0,0 +1,257 @@
+'''
+Batch runner of whole experiment sessions on the null (offscreen) backend
+#
+Runs many complete ver2_experiment sessions in a pool of processes, each
+session in its own folder (OUT/<session>/data, emptied first, so a batch
+run again into the same OUT runs every session again) with scripted
+responses:
+replay = the trial list, the 9-patch layouts & the responses of recorded
+data files (*_ep_experiment.csv), e.g. to check a change against the
+archive of past sessions. Files recorded before the orientations of the
+set were saved (no Ori_Position_1-9 columns) get new layouts
+(build_layouts), and only their trial & response columns are compared
+simulate = new trial lists answered by the simulated observer
+(simulate.py), e.g. to stress-test the trial generation & the output
+#
+The trials of every session are started through the resume path of the
+experiment (the design is saved as <prefix>_design.npz first), and the
+data file it writes is compared with the expected rows (trial, layout &
+response, not the date or the latency). The report gives the sessions per
+minute and every failed session:
+python batch.py --replay "archive/*_ep_experiment.csv" --jobs 4
+python batch.py --simulate 200 --rule postcue --profile smoke --seed 1
+'''
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+os.environ['EP_BACKEND'] = 'null'
+
+import numpy as np  # noqa: E402
+
+from config import load_config  # noqa: E402
+from results import orientation_columns  # noqa: E402
+from simulate import rules, simulate_sessions  # noqa: E402
+from trial_design import build_layouts, trial_dtype  # noqa: E402
+from trial_design import orientations_by_position  # noqa: E402
+
+summary_columns = ['Session', 'Source', 'OK', 'Trials', 'Seconds', 'Error']
+trial_columns = ['Trial_No', 'Condition', 'Cued_Orientation',
+                 'Set_Orientation', 'Position', 'Response']
+compared_columns = trial_columns + orientation_columns
+
+
+def recorded_design(file_name):
+    '''
+    Trial list, (n, 9, 2) layouts & responses of a data file, the cued
+    position first in every layout, layouts = None if the file has no
+    orientations of the set (recorded before they were saved)
+    '''
+    with open(file_name, newline='') as data_file:
+        reader = csv.DictReader(data_file)
+        rows = list(reader)
+        columns = reader.fieldnames or []
+    triallist = np.array([(int(row['Condition']), int(row['Set_Orientation']),
+                           int(row['Cued_Orientation']), int(row['Position']))
+                          for row in rows], dtype=trial_dtype)
+    responses = [row['Response'] for row in rows]
+    if not set(orientation_columns) <= set(columns):
+        return triallist, None, responses
+    layouts = np.empty((len(rows), 9, 2), dtype='i2')
+    for i, row in enumerate(rows):
+        cued = int(row['Position'])
+        positions = [cued] + [position for position in range(1, 10)
+                              if position != cued]
+        layouts[i, :, 0] = positions
+        layouts[i, :, 1] = [int(row['Ori_Position_{}'.format(position)])
+                            for position in positions]
+    return triallist, layouts, responses
+
+
+def response_script(responses, breaktrial):
+    '''
+    Keys of a whole session: start the experiment, the response of every
+    trial and 'f' to continue after every break
+    '''
+    script = ['f']
+    for i, response in enumerate(responses):
+        script.append(response)
+        if response == 'end':
+            break
+        if i in breaktrial and response in ('f', 'j'):
+            script.append('f')
+    return script
+
+
+def expected_rows(triallist, layouts, responses, columns=compared_columns):
+    # compared columns of the trial rows the session should write
+    by_position = orientations_by_position(layouts)
+    rows = []
+    for i, response in enumerate(responses):
+        trial = triallist[i]
+        row = [i + 1, trial['condition'], trial['cued_orientation'],
+               trial['set_orientation'], trial['position'], response]
+        if columns is compared_columns:
+            row += by_position[i].tolist()
+        rows.append([str(value) for value in row])
+        if response == 'end':
+            break
+    return rows
+
+
+def run_session(task):
+    '''
+    Run 1 session in its folder, return its summary row (summary_columns)
+    task = (name, source, config, out_dir, rule, seed), source is a data
+    file to replay or None to simulate
+    '''
+    name, source, config, out_dir, rule, seed = task
+    start = time.perf_counter()
+    trials = 0
+    columns = compared_columns
+    try:
+        import null_backend
+        import ver2_experiment
+        session_dir = os.path.join(out_dir, name)
+        # the session resumes from the files in data/, files of an earlier
+        # batch in the same folder would pass as already run
+        shutil.rmtree(os.path.join(session_dir, 'data'), ignore_errors=True)
+        os.makedirs(os.path.join(session_dir, 'data'))
+        os.chdir(session_dir)
+
+        session = ver2_experiment.ExperimentSession(config)
+        if source is None:
+            triallist, layouts = session.triallist, session.layouts
+            # the profile may run fewer trials than the design holds
+            responses = simulate_sessions(triallist, 1, rule, rng=seed)[0]
+            responses = responses[:session.No_of_Trials].tolist()
+        else:
+            triallist, layouts, responses = recorded_design(source)
+            if layouts is None:
+                # no orientations of the set recorded, compare the trials
+                layouts = build_layouts(triallist)
+                columns = trial_columns
+            if len(triallist) > session.No_of_Trials:
+                raise ValueError("{} trials recorded, the profile has {}"
+                                 .format(len(triallist),
+                                         session.No_of_Trials))
+            if len(triallist) < session.No_of_Trials:
+                # the trials after the stop are never shown
+                triallist = np.resize(triallist, session.No_of_Trials)
+                layouts = np.resize(layouts, (session.No_of_Trials, 9, 2))
+                if responses[-1] != 'end':
+                    # the recorded session stopped early, stop there too
+                    responses = responses + ['end']
+        expected = expected_rows(triallist, layouts, responses, columns)
+
+        # the session resumes from trial 1 with this design
+        prefix = 'data/20000101000000_' + name
+        np.savez(prefix + '_design.npz', triallist=triallist,
+                 layouts=layouts)
+        null_backend.set_dialog(['20000101', '000000', name, '0', 'Male',
+                                 'Right', 'Yes'])
+        null_backend.set_responses(response_script(responses,
+                                                   session.breaktrial),
+                                   seed=seed)
+        try:
+            ver2_experiment.main(config)
+        except SystemExit:
+            pass
+
+        with open(prefix + '_ep_experiment.csv', newline='') as data_file:
+            written = [[row[column] for column in columns]
+                       for row in csv.DictReader(data_file)]
+        trials = len(written)
+        if len(written) != len(expected):
+            raise AssertionError("{} trials written, {} expected".format(
+                len(written), len(expected)))
+        for row, expected_row in zip(written, expected):
+            if row != expected_row:
+                raise AssertionError("trial {} differs: {} != {}".format(
+                    expected_row[0], row, expected_row))
+        error = ''
+    except Exception:
+        error = traceback.format_exc().strip().splitlines()[-1]
+    return [name, source or 'simulated', not error, trials,
+            time.perf_counter() - start, error]
+
+
+def quiet_worker():
+    # the sessions print their banner & clear the terminal, hide that
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    sys.stdout = open(os.devnull, 'w')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run many experiment sessions on the null backend")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--replay', default=None,
+                        help="glob of recorded *_ep_experiment.csv files")
+    source.add_argument('--simulate', type=int, default=None,
+                        help="number of simulated sessions")
+    parser.add_argument('--rule', choices=rules, default='postcue',
+                        help="decision rule of the simulated observer")
+    parser.add_argument('--profile', default=None)
+    parser.add_argument('--config', default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="number of processes, default all CPUs")
+    parser.add_argument('--out', default=None,
+                        help="folder of the sessions, default a new "
+                        "temporary folder")
+    args = parser.parse_args()
+    config = load_config(args.profile, args.config, args=[])
+    if config['adaptive_trials']:
+        parser.error("adaptive profiles choose their trials while they run "
+                     "and cannot be scripted")
+    out_dir = os.path.abspath(args.out or
+                              tempfile.mkdtemp(prefix='ep_batch_'))
+    os.makedirs(out_dir, exist_ok=True)
+
+    seeds = np.random.SeedSequence(args.seed)
+    if args.replay:
+        files = sorted(glob.glob(args.replay))
+        sources = [os.path.abspath(file_name) for file_name in files]
+    else:
+        sources = [None] * args.simulate
+    tasks = [('session{:05d}'.format(i + 1), source, config, out_dir,
+              args.rule, int(seed.generate_state(1)[0]))
+             for i, (source, seed) in enumerate(
+                 zip(sources, seeds.spawn(len(sources))))]
+    if not tasks:
+        print("No sessions to run")
+        return
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs,
+                             initializer=quiet_worker) as pool:
+        summary = list(pool.map(run_session, tasks))
+    elapsed = time.perf_counter() - start
+
+    with open(os.path.join(out_dir, 'batch_summary.csv'), 'w',
+              newline='') as summary_file:
+        writer = csv.writer(summary_file)
+        writer.writerow(summary_columns)
+        writer.writerows(summary)
+    failures = [row for row in summary if not row[2]]
+    print("{} sessions in {:.1f} s ({:.1f} sessions/min), {} failed".format(
+        len(summary), elapsed, len(summary) / elapsed * 60, len(failures)))
+    for row in failures:
+        print("FAILED {} ({}): {}".format(row[0], row[1], row[5]))
+    print("Sessions & summary in {}".format(out_dir))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+'''
+Benchmark of the trial loops on the null (offscreen) backend
+#
+Runs ver2_experiment.main() and the 4 practice loops (practice_s_s,
+practice_e_e, practice_s_e, practice_e_s) with scripted keypresses and
+times every stage of a trial in Python:
+setup = stimulus construction, trial list & layouts
+calibration = the flips measuring the refresh rate when the window opens
+draw = fixation, precue, gaborset, postcue & feedback drawing
+flip = win.flip
+response = waiting for the response (keyboard polling & post-cue flips)
+row = building the trial row, write = writing it to the data file
+(in the background I/O thread)
+Stages called inside a break are counted in the break stage only.
+#
+The report gives p50 / p95 / p99 latencies per stage, the frames where
+the Python work between 2 flips took longer than 1 frame (these would be
+dropped on the real display), and is saved as json to compare versions:
+python benchmark.py --out new.json --compare old.json
+'''
+
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+
+os.environ['EP_BACKEND'] = 'null'
+os.environ.setdefault('EP_SEED', '0')
+
+import numpy as np  # noqa: E402
+
+import engine  # noqa: E402
+import results  # noqa: E402
+import session  # noqa: E402
+import stimuli  # noqa: E402
+import trial_design  # noqa: E402
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+_originals = {}  # unwrapped functions, so every run wraps them only once
+
+
+class StageTimer:
+    '''
+    Collect the wall-clock duration of every call of the wrapped functions,
+    and the Python work done between consecutive flips
+    '''
+
+    def __init__(self):
+        self.samples = {}
+        self.frame_work = []
+        self._local = threading.local()  # active stages of each thread
+        self._last_flip = None
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            if getattr(self._local, 'active', False):
+                # nested in another stage, e.g. a break
+                return function(*args, **kwargs)
+            self._local.active = True
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                self._local.active = False
+                self.samples.setdefault(stage, []).append(end - start)
+                if stage == 'flip':
+                    if self._last_flip is not None:
+                        self.frame_work.append(start - self._last_flip)
+                    self._last_flip = end
+                else:
+                    # waiting for a response or a break is not frame work
+                    if stage in ('response', 'break', 'calibration'):
+                        self._last_flip = None
+        return timed
+
+    def report(self, frame_duration):
+        stages = {}
+        for stage, samples in self.samples.items():
+            samples = np.array(samples) * 1000
+            stages[stage] = {'n': len(samples),
+                             'mean_ms': float(samples.mean()),
+                             'p50_ms': float(np.percentile(samples, 50)),
+                             'p95_ms': float(np.percentile(samples, 95)),
+                             'p99_ms': float(np.percentile(samples, 99)),
+                             'max_ms': float(samples.max())}
+        frame_work = np.array(self.frame_work)
+        return {'stages': stages,
+                'frames': {'n': len(frame_work),
+                           'over_budget': int((frame_work >
+                                               frame_duration).sum()),
+                           'frame_duration_ms': frame_duration * 1000}}
+
+
+def patch(timer, stage, owner, name):
+    # replace owner.name by the timed version of the original function
+    if not hasattr(owner, name):
+        return
+    original = _originals.setdefault((id(owner), name), getattr(owner, name))
+    setattr(owner, name, timer.wrap(stage, original))
+
+
+def wrap_setup(timer):
+    # stimulus construction & trial generation, before the modules import
+    # (session imported create_stimuli & calibrate by name, patch its copy)
+    patch(timer, 'setup', stimuli, 'create_stimuli')
+    patch(timer, 'setup', session, 'create_stimuli')
+    patch(timer, 'calibration', session, 'calibrate')
+    patch(timer, 'setup', trial_design, 'build_triallist')
+    patch(timer, 'setup', trial_design, 'build_layouts')
+    patch(timer, 'write', results.TrialWriter, 'write_row')
+
+
+def wrap_session(timer, running):
+    # flips & response polling of an open session window
+    patch(timer, 'flip', running.win, 'flip')
+    patch(timer, 'response', running.responses, 'collect')
+
+
+def wrap_module(timer, module):
+    # the trial screens of every script are drawn by the trial engine
+    for name in ('fixation', 'precue', 'gaborset', 'postcue', 'feedback'):
+        patch(timer, 'draw', engine, name)
+    patch(timer, 'break', module, 'break_time')
+    patch(timer, 'row', module, 'trial_row')
+    patch(timer, 'response', module.event, 'waitKeys')
+    # the window only exists once main() opens it
+    open_window = _originals.setdefault((id(session.Session), 'open_window'),
+                                        session.Session.open_window)
+
+    def timed_open_window(running, *args, **kwargs):
+        win = open_window(running, *args, **kwargs)
+        wrap_session(timer, running)
+        return win
+    session.Session.open_window = timed_open_window
+
+
+def run(label, function, timer, module, dropped_frames=False):
+    start = time.perf_counter()
+    try:
+        function()
+    except SystemExit:
+        pass
+    elapsed = time.perf_counter() - start
+    scheduler = module.session.scheduler
+    report = timer.report(scheduler.frame_duration)
+    report['wall_time_s'] = elapsed
+    if dropped_frames:
+        report['dropped_frames'] = scheduler.dropped_frames()
+    print_report(label, report)
+    return report
+
+
+def print_report(label, report):
+    print("\n{}  ({:.2f} s)".format(label, report['wall_time_s']))
+    print("{:<12}{:>8}{:>10}{:>10}{:>10}{:>10}".format(
+        'stage', 'n', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms'))
+    for stage, stats in sorted(report['stages'].items()):
+        print("{:<12}{:>8}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.3f}".format(
+            stage, stats['n'], stats['p50_ms'], stats['p95_ms'],
+            stats['p99_ms'], stats['max_ms']))
+    frames = report['frames']
+    print("frames over budget: {} of {} ({:.2f} ms per frame)".format(
+        frames['over_budget'], frames['n'], frames['frame_duration_ms']))
+    if 'dropped_frames' in report:
+        print("dropped frames (flip log): {}".format(
+            report['dropped_frames']))
+
+
+def compare(report, baseline):
+    # p50 / p95 ratio of every stage against a previous report
+    print("\nCompared to {} ({})".format(baseline.get('commit'),
+                                         baseline.get('date')))
+    for run_name, run_report in report['runs'].items():
+        old_run = baseline['runs'].get(run_name)
+        if old_run is None:
+            continue
+        print(run_name)
+        for stage, stats in sorted(run_report['stages'].items()):
+            old = old_run['stages'].get(stage)
+            if old is None or not old['p50_ms'] or not old['p95_ms']:
+                continue
+            print("  {:<12} p50 x{:.2f}  p95 x{:.2f}".format(
+                stage, stats['p50_ms'] / old['p50_ms'],
+                stats['p95_ms'] / old['p95_ms']))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the trial loops on the null backend")
+    parser.add_argument('--out', default=None, help="json report file")
+    parser.add_argument('--compare', default=None,
+                        help="previous json report to compare with")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out) if args.out else None
+    baseline_file = os.path.abspath(args.compare) if args.compare else None
+
+    # the scripts save their data files in ./data, keep them out of the repo
+    os.chdir(tempfile.mkdtemp(prefix='ep_benchmark_'))
+    report = {'commit': git_commit(),
+              'date': datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'runs': {}}
+
+    timer = StageTimer()
+    wrap_setup(timer)
+    import ver2_experiment
+    wrap_module(timer, ver2_experiment)
+    report['runs']['ver2_experiment.main'] = run(
+        'ver2_experiment.main', ver2_experiment.main, timer, ver2_experiment,
+        dropped_frames=True)
+
+    import practice_trials
+    practice_trials.session = practice_trials.PracticeSession()
+    practice_trials.session.open_window(cue_fill_color=None)
+    for name in ('practice_s_s', 'practice_e_e', 'practice_s_e',
+                 'practice_e_s'):
+        timer = StageTimer()
+        wrap_module(timer, practice_trials)
+        wrap_session(timer, practice_trials.session)
+        label = 'practice_trials.' + name
+        report['runs'][label] = run(label, getattr(practice_trials, name),
+                                    timer, practice_trials)
+
+    if out:
+        with open(out, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print("\nReport saved to {}".format(out))
+    if baseline_file:
+        with open(baseline_file) as report_file:
+            compare(report, json.load(report_file))
+
+
+if __name__ == '__main__':
+    main()
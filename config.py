@@ -0,0 +1,240 @@
+'''
+Monitor, timing & design profiles shared by the experiment and practice
+#
+A profile holds every rig & session constant of the two scripts (monitor,
+screen, line width, screen durations in seconds and the trial design).
+The built-in profiles are:
+RLG307 = the 2 monitors in RLG307 (default)
+home = the home monitor
+smoke = home monitor with short durations, breaks & trial counts, to
+check a session from start to end in a few seconds
+#
+The refresh rate is always measured when the window opens (see
+presentation.calibrate), the durations are converted to frames with the
+measured rate. refresh_rate is the rate the rig should run at (a warning
+otherwise), calibration_flips the number of flips measured and
+max_late_fraction the fraction of late 9-Gabor flips that stops the
+session. gabor_rendering is how the 9-Gabor set is drawn: 'gratings'
+(the 9 GratingStims of the design), 'elements' (1 ElementArrayStim) or
+'atlas' (pre-rendered), check the last 2 on the display with
+gabor_check.py before using them, see stimuli.py. break_poll_time is
+the sleep between the keyboard polls of a break, record_telemetry saves
+the screen onsets & durations of every trial (see telemetry.py).
+#
+The profile is chosen on the command line or by environment variables
+(e.g. for the benchmark), the command line wins:
+python ver2_experiment.py --profile home
+python ver2_experiment.py --config rigs.json --profile lab2
+EP_PROFILE=smoke EP_CONFIG=rigs.json
+A config file is json of {profile name: {name: value}}, a profile can
+extend another one with "base" (a built-in profile or one in the file)
+and only give the values that differ, e.g.
+{"lab2": {"base": "RLG307", "screen_resolution": [2560, 1440]}}
+#
+load_config() validates the whole profile once at startup and raises
+ValueError with every invalid value.
+'''
+
+import argparse
+import json
+import numbers
+import os
+
+profiles = {
+    'RLG307': {
+        'monitor_name': 'RLG307',
+        'view_distance': 60,
+        'screen_width': 59.8,
+        'screen_resolution': [3840, 2160],
+        'refresh_rate': None,  # expected frames per second, None = any
+        'calibration_flips': 200,
+        'max_late_fraction': 0.05,
+        'gabor_rendering': 'gratings',
+        'line_width_in_pixel': 13,
+        'fixation_time': 0.25,
+        'precue_time': 0.75,
+        'gaborset_time': 0.2,
+        'blankscreen_time': 0.4,
+        'isi_time': 0.5,
+        'feedback_screen_time': 1,
+        'short_break_time': 60,
+        'long_break_time': 120,
+        'break_poll_time': 0.01,  # sleep between the keyboard polls
+        'No_of_Trials': 392,
+        'No_of_Practice_Trials': 40,
+        'conditions': [1, 2, 3, 4],
+        'set_orientations': [0, 10, -10, 20, -20, 30, -30],
+        'cued_orientations': [0, 10, -10, 20, -20, 30, -30],
+        'max_condition_run': None,
+        'balance_positions': False,
+        'adaptive_trials': None,
+        'record_telemetry': False,  # screen onsets & durations per trial
+    },
+    'home': {
+        'base': 'RLG307',
+        'monitor_name': 'testMonitor',
+        'screen_width': 47.5,
+        'screen_resolution': [1680, 1050],
+        'line_width_in_pixel': 7,
+    },
+    'smoke': {
+        'base': 'home',
+        'fixation_time': 0.05,
+        'precue_time': 0.05,
+        'gaborset_time': 0.05,
+        'blankscreen_time': 0.05,
+        'isi_time': 0.05,
+        'feedback_screen_time': 0.05,
+        'short_break_time': 1,
+        'long_break_time': 2,
+        'No_of_Trials': 40,
+        'No_of_Practice_Trials': 8,
+        'calibration_flips': 20,
+    },
+}
+
+default_profile = 'RLG307'
+gabor_renderings = ('elements', 'gratings', 'atlas')  # see stimuli.py
+_durations = ('fixation_time', 'precue_time', 'gaborset_time',
+              'blankscreen_time', 'isi_time', 'feedback_screen_time',
+              'short_break_time', 'long_break_time', 'break_poll_time')
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _is_int(value):
+    return isinstance(value, numbers.Integral) and not isinstance(value,
+                                                                  bool)
+
+
+def resolve(name, available):
+    # merge a profile with its base profiles, base first
+    chain = []
+    while name is not None:
+        if name not in available:
+            raise ValueError("Unknown profile: {} ({})".format(
+                name, ', '.join(sorted(available))))
+        if name in chain:
+            raise ValueError("Circular base profiles: {}".format(
+                ' -> '.join(chain + [name])))
+        chain.append(name)
+        name = available[name].get('base')
+    config = {}
+    for name in reversed(chain):
+        config.update(available[name])
+    config.pop('base', None)
+    config['profile'] = chain[0]
+    return config
+
+
+def validate(config):
+    '''
+    Check every value of a resolved profile,
+    raise ValueError listing all the problems
+    '''
+    problems = []
+    known = set(profiles[default_profile]) | {'profile'}
+    for name in sorted(set(config) - known):
+        problems.append("unknown setting {}".format(name))
+    for name in sorted(known - set(config)):
+        problems.append("missing setting {}".format(name))
+    if problems:
+        raise ValueError("Invalid profile {}: {}".format(
+            config.get('profile'), '; '.join(problems)))
+
+    def check(ok, name, expected):
+        if not ok:
+            problems.append("{} = {!r} (expected {})".format(
+                name, config[name], expected))
+
+    check(isinstance(config['monitor_name'], str), 'monitor_name', 'a name')
+    for name in ('view_distance', 'screen_width', 'line_width_in_pixel'):
+        check(_is_number(config[name]) and config[name] > 0, name,
+              'a positive number')
+    resolution = config['screen_resolution']
+    check(isinstance(resolution, (list, tuple)) and len(resolution) == 2 and
+          all(_is_int(size) and size > 0 for size in resolution),
+          'screen_resolution', '[width, height] in pixels')
+    check(config['refresh_rate'] is None or
+          (_is_number(config['refresh_rate']) and
+           config['refresh_rate'] > 0), 'refresh_rate',
+          'None or frames per second')
+    check(_is_int(config['calibration_flips']) and
+          config['calibration_flips'] > 1, 'calibration_flips',
+          'a number of flips above 1')
+    check(config['gabor_rendering'] in gabor_renderings, 'gabor_rendering',
+          ' or '.join(gabor_renderings))
+    check(_is_number(config['max_late_fraction']) and
+          0 <= config['max_late_fraction'] <= 1, 'max_late_fraction',
+          'a fraction 0-1')
+    for name in _durations:
+        check(_is_number(config[name]) and config[name] > 0, name,
+              'a positive duration in seconds')
+    for name in ('No_of_Trials', 'No_of_Practice_Trials'):
+        check(_is_int(config[name]) and config[name] > 0, name,
+              'a positive number of trials')
+    check(isinstance(config['conditions'], list) and
+          len(config['conditions']) > 0 and
+          all(condition in (1, 2, 3, 4) for condition in config['conditions'])
+          and len(set(config['conditions'])) == len(config['conditions']),
+          'conditions', 'a list of different conditions 1-4')
+    for name in ('set_orientations', 'cued_orientations'):
+        check(isinstance(config[name], list) and len(config[name]) > 0 and
+              all(_is_int(ori) and -90 <= ori <= 90 for ori in config[name]),
+              name, 'a list of orientations in deg (integers)')
+    check(config['max_condition_run'] is None or
+          (_is_int(config['max_condition_run']) and
+           config['max_condition_run'] > 0), 'max_condition_run',
+          'None or a positive number of trials')
+    check(isinstance(config['balance_positions'], bool),
+          'balance_positions', 'true or false')
+    check(isinstance(config['record_telemetry'], bool),
+          'record_telemetry', 'true or false')
+    check(config['adaptive_trials'] is None or
+          (_is_int(config['adaptive_trials']) and
+           config['adaptive_trials'] > 0), 'adaptive_trials',
+          'None or a positive number of trials')
+    if not problems and not config['adaptive_trials']:
+        design_trials = len(config['conditions']) * \
+            len(config['set_orientations']) * \
+            len(config['cued_orientations']) * 2
+        check(config['No_of_Trials'] <= design_trials, 'No_of_Trials',
+              'at most the {} trials of the design'.format(design_trials))
+        # each condition has the same number of trials, which the others
+        # must split into runs of at most max_condition_run
+        max_run = config['max_condition_run']
+        per_condition = design_trials // len(config['conditions'])
+        check(max_run is None or per_condition <=
+              max_run * (design_trials - per_condition + 1),
+              'max_condition_run', 'None or at least {} trials with {} '
+              'condition(s)'.format(-(-per_condition // (
+                  design_trials - per_condition + 1)),
+                  len(config['conditions'])))
+    if problems:
+        raise ValueError("Invalid profile {}: {}".format(
+            config['profile'], '; '.join(problems)))
+    return config
+
+
+def load_config(profile=None, config_file=None, args=None):
+    '''
+    Load & validate a profile, by default the one given on the command
+    line (--profile, --config), else by EP_PROFILE & EP_CONFIG, else RLG307
+    return a dict of the settings, with the profile name under 'profile'
+    '''
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--profile', default=None)
+    parser.add_argument('--config', default=None)
+    known, _ = parser.parse_known_args(args)
+    profile = profile or known.profile or os.environ.get('EP_PROFILE') or \
+        default_profile
+    config_file = config_file or known.config or \
+        os.environ.get('EP_CONFIG')
+
+    available = dict(profiles)
+    if config_file:
+        with open(config_file) as settings:
+            available.update(json.load(settings))
+    return validate(resolve(profile, available))
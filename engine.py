@@ -0,0 +1,207 @@
+'''
+Trial engine shared by the experiment and the practice
+#
+Every trial runs the same pipeline of screens:
+fixation -> precue -> gaborset -> blank -> postcue (until the response)
+-> feedback (practice only) -> isi
+The timed screens before the post-cue are the phases (trial_phases), each
+a (screen name, draw function, duration setting of the profile). The
+post-cue stays on display while the background keyboard is polled (see
+responses.py), so the response latency is timestamped by the keyboard.
+#
+The runs only differ by a mode (modes):
+test = the experiment trials
+practice = the random practice trials, with feedback
+tutorial = the practice trials after a walkthrough, with feedback, at
+most 10 trials, 'return' skips the rest
+The condition of a tutorial run is fixed (e.g. 1 = single-single), and the
+experiment adds its data file, adaptive design & breaks through the hooks
+of TrialEngine.run().
+'''
+
+from scoring import score
+from stimuli import pos_to_coordinate
+
+modes = {
+    'test': {'keys': ['end', 'f', 'j'], 'stop_keys': ['end'],
+             'feedback': False, 'max_trials': None},
+    'practice': {'keys': ['end', 'f', 'j'], 'stop_keys': ['end'],
+                 'feedback': True, 'max_trials': None},
+    'tutorial': {'keys': ['return', 'end', 'f', 'j'],
+                 'stop_keys': ['return', 'end'],
+                 'feedback': True, 'max_trials': 10},
+}
+
+
+def fixation(stim):
+    # drawing the cached fixation cross to memeory
+    stim['fix_hori'].draw()
+    stim['fix_vert'].draw()
+
+
+def precue(stim, condition, position):
+    """
+    Creating and drawing the pre-cue circle to memory
+    Condition 1 = single pre-cue congruent trial
+    Condition 2 = single pre-cue incongruent trial
+    Condition 3 = ensemble pre-cue congruent trial
+    Condition 4 = ensemble pre-cue incongruent trial
+    #
+    Condition 1 & 2 --> Return single pre-cue
+    Condition 3 & 4 --> Return ensemble pre-cue
+    """
+    if (condition == 1 or condition == 2):
+        stim['single_cue'].pos = pos_to_coordinate(position)
+        stim['single_cue'].draw()
+    elif (condition == 3 or condition == 4):
+        stim['set_cue'].draw()
+
+
+def gaborset(stim, layout):
+    '''
+    creating the 9-gabor set, one central grating surrounded by
+    8 flanker gratings, each position uses its cached grating in stim
+    layout = (9, 2) array of (position, orientation) from build_layouts
+    only draw the set to memory
+    '''
+    if stim['gabor_set'] is not None:
+        # 1 ElementArrayStim or the pre-rendered set (see stimuli.py)
+        stim['gabor_set'].draw(layout)
+        return
+    for position, orientation in layout:
+        grating = stim['gratings'][position]
+        grating.ori = orientation
+        grating.draw()
+
+
+def postcue(stim, condition, position):
+    """
+    Creating and drawing the post-cue circle to memory
+    Condition 1 = single pre-cue congruent trial
+    Condition 2 = single pre-cue incongruent trial
+    Condition 3 = ensemble pre-cue congruent trial
+    Condition 4 = ensemble pre-cue incongruent trial
+    #
+    Condition 1 & 4--> Return single post-cue
+    Condition 2 & 3 --> Return ensemble post-cue
+    """
+    if (condition == 1 or condition == 4):
+        stim['single_cue'].pos = pos_to_coordinate(position)
+        stim['single_cue'].draw()
+    elif (condition == 2 or condition == 3):
+        stim['set_cue'].draw()
+
+
+def feedback(stim, condition, set_orientation, cued_orientation, response):
+    # Draw the cached Feedback for Practice Trial to memory
+    '''
+    Draw a green circle for correct, red for wrong (see scoring.py)
+    if 0 in ori: always correct
+    '''
+    if score(condition, set_orientation, cued_orientation, response):
+        stim['correct_fb'].draw()
+    else:
+        stim['wrong_fb'].draw()
+
+
+# the draw functions are looked up when called, so they can be replaced
+# (e.g. timed by the benchmark)
+trial_phases = [
+    ('fixation', lambda stim, trial, layout: fixation(stim),
+     'fixation_time'),
+    ('precue', lambda stim, trial, layout: precue(stim, trial[0], trial[3]),
+     'precue_time'),
+    ('gaborset', lambda stim, trial, layout: gaborset(stim, layout),
+     'gaborset_time'),
+    ('blank', None, 'blankscreen_time'),
+]
+
+
+class TrialEngine:
+    '''
+    Run the trials of an open session (see session.py) in one of the modes
+    phases = list of (screen, draw(stim, trial, layout) or None for a
+    blank, duration setting) shown before the post-cue
+    '''
+
+    def __init__(self, session, mode='test', phases=None):
+        self.session = session
+        self.mode = modes[mode]
+        self.phases = trial_phases if phases is None else phases
+
+    def trial(self, trial_no, condition=None):
+        # trial spec: row of the trial list & its layout, condition forced
+        trial = self.session.triallist[trial_no].copy()
+        if condition is not None:
+            trial['condition'] = condition
+        return trial, self.session.layouts[trial_no]
+
+    def present_trial(self, trial, layout):
+        '''
+        Show the phases & the post-cue until a key of the mode is pressed
+        return (key, latency from the post-cue onset), (None, None) if
+        no key was pressed
+        '''
+        session = self.session
+        stim = session.stim
+        scheduler = session.scheduler
+        config = session.config
+        for screen, draw, duration in self.phases:
+            scheduler.present(
+                screen, None if draw is None else
+                lambda: draw(stim, trial, layout), config[duration])
+        # postcue screen, kept on display until the response
+        draw_postcue = lambda: postcue(stim, trial[0], trial[3])
+        session.responses.clear_on_flip()
+        postcue_onset = scheduler.flip('postcue', draw_postcue)
+        key, latency = session.responses.collect(
+            'postcue', draw_postcue, postcue_onset,
+            keyList=self.mode['keys'])
+        if scheduler.telemetry is not None:
+            scheduler.telemetry.record(scheduler.trial, 'response',
+                                       postcue_onset, postcue_onset,
+                                       float('nan'), latency)
+        return key, latency
+
+    def answered(self, trial, key):
+        # feedback (if any) & ISI after an 'f' / 'j' response
+        session = self.session
+        if self.mode['feedback']:
+            session.scheduler.present(
+                'feedback',
+                lambda: feedback(session.stim, trial[0], trial[1], trial[2],
+                                 key),
+                session.config['feedback_screen_time'])
+        session.scheduler.present('isi', None, session.config['isi_time'])
+
+    def run(self, first_trial, last_trial, condition=None, before_trial=None,
+            after_response=None, after_trial=None):
+        '''
+        Run the trials first_trial to last_trial - 1 of the trial list
+        (at most max_trials of the mode), with the condition forced if given
+        before_trial(trial_no) = e.g. choose an adaptive trial
+        after_response(trial_no, trial, key, latency) = e.g. save the row
+        after_trial(trial_no) = after the ISI of an answered trial, e.g. a
+        break
+        return the stop key of the mode that ended the run, None if all
+        trials ran
+        '''
+        if self.mode['max_trials'] is not None:
+            last_trial = min(last_trial,
+                             first_trial + self.mode['max_trials'])
+        for trial_no in range(first_trial, last_trial):
+            self.session.scheduler.trial = trial_no + 1
+            if before_trial is not None:
+                before_trial(trial_no)
+            trial, layout = self.trial(trial_no, condition)
+            key, latency = self.present_trial(trial, layout)
+            if after_response is not None:
+                after_response(trial_no, trial, key, latency)
+            if key in self.mode['stop_keys']:
+                return key
+            elif key == 'f' or key == 'j':
+                # Anticlockwise ('f') or Clockwise ('j') response
+                self.answered(trial, key)
+                if after_trial is not None:
+                    after_trial(trial_no)
+        return None
@@ -0,0 +1,110 @@
+'''
+Pixel check of the 9-Gabor renderings against the gratings, on the display
+#
+The experiment was designed with 9 rotated GratingStims (gabor_rendering
+= 'gratings', the default). 'elements' draws the set as 1
+ElementArrayStim (GaborElements) and 'atlas' as pre-rendered textures
+(GaborAtlas, gabor_texture). Before a rig uses one of them, every
+orientation of the profile is drawn as the grating & with the rendering
+at the centre of the window and the back buffers are compared (the sign
+& phase of the texture, the contrast, the sf units and the blending all
+show up as pixel differences):
+python gabor_check.py --profile RLG307
+python gabor_check.py --profile RLG307 --rendering atlas
+The report gives the largest & mean difference (0-255) per orientation,
+the check fails (exit code 1) if any pixel differs by more than
+--tolerance. It needs psychopy & a window, not the null backend.
+'''
+
+import argparse
+import sys
+
+import numpy as np
+
+from backends import monitors, visual
+from config import load_config
+from session import Session
+from stimuli import GaborAtlas, GaborElements, create_stimuli, \
+    monitor_geometry
+
+
+def grab(win, draw):
+    # pixels of the back buffer after drawing on a cleared window
+    win.clearBuffer()
+    draw()
+    frame = np.asarray(win.getMovieFrame(buffer='back'), dtype=int)
+    win.movieFrames = []
+    return frame
+
+
+def compare_rendering(win, stim, gabor_set, orientations):
+    '''
+    Draw each orientation as the centre grating & with gabor_set
+    (GaborElements or GaborAtlas), the other 8 positions of the set are
+    left empty (elements hidden by opacity 0), return a list of
+    (orientation, max difference, mean difference)
+    '''
+    grating = stim['gratings'][5]
+    if isinstance(gabor_set, GaborElements):
+        opacities = np.zeros(9)
+        opacities[4] = 1
+        gabor_set.elements.opacities = opacities
+    differences = []
+    for orientation in orientations:
+        layout = np.array([[5, orientation]])
+
+        def draw_grating():
+            grating.ori = orientation
+            grating.draw()
+
+        reference = grab(win, draw_grating)
+        rendered = grab(win, lambda: gabor_set.draw(layout))
+        difference = np.abs(reference - rendered)
+        differences.append((int(orientation), int(difference.max()),
+                            float(difference.mean())))
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare a 9-Gabor rendering with the gratings pixel "
+        "by pixel")
+    parser.add_argument('--profile', default=None)
+    parser.add_argument('--config', default=None)
+    parser.add_argument('--rendering', choices=['elements', 'atlas'],
+                        default='elements')
+    parser.add_argument('--tolerance', type=int, default=2,
+                        help="largest pixel difference allowed (0-255)")
+    args = parser.parse_args()
+    config = load_config(args.profile, args.config, args=[])
+    orientations = Session(config).gabor_orientations()
+
+    mon = monitors.Monitor(config['monitor_name'])
+    mon.setWidth(config['screen_width'])
+    mon.setDistance(config['view_distance'])
+    win = visual.Window(size=config['screen_resolution'], color='#C0C0C0',
+                        fullscr=True, monitor=mon)
+    stim = create_stimuli(win, config['line_width_in_pixel'],
+                          monitor_geometry(config), gabor_rendering='gratings')
+    if args.rendering == 'elements':
+        gabor_set = GaborElements(win)
+    else:
+        gabor_set = GaborAtlas(win, orientations)
+    differences = compare_rendering(win, stim, gabor_set, orientations)
+    win.close()
+
+    failed = 0
+    for orientation, largest, mean in differences:
+        ok = largest <= args.tolerance
+        failed += not ok
+        print("{:4d} deg: max {:3d}, mean {:.2f} {}".format(
+            orientation, largest, mean, 'ok' if ok else 'DIFFERS'))
+    print("{}: {} of {} orientations differ from the gratings by more "
+          "than {}".format(args.rendering, failed, len(differences),
+                           args.tolerance))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+'''
+Null (offscreen) display backend
+#
+Stand-ins for the psychopy modules used by the experiment and practice
+scripts (visual, event, monitors, core, logging, gui and the hardware
+keyboard), with the same calls
+but no window, OpenGL or keyboard behind them. Time is a virtual clock:
+a flip moves it to the next frame and core.wait moves it forward without
+sleeping, so a full 392-trial session runs in seconds.
+#
+Responses are scripted: keys listed in the EP_RESPONSES file (one key per
+line) or given to set_responses() are used first, afterwards 'f' / 'j'
+are chosen at random (seeded by EP_SEED) and any other prompt is answered
+with its first key that is not 'end'.
+The dialogs keep their initial values, unless answers are given to
+set_dialog() (e.g. the observer's info of a batch session).
+'''
+
+from collections import deque
+import os
+import random
+from types import SimpleNamespace
+
+refresh_rate = 60
+response_time = 0.6  # virtual seconds taken by every scripted response
+
+_now = [0.0]
+_responses = deque()
+_random = random.Random(os.environ.get('EP_SEED'))
+_dialog = []  # answers of the next dialog, [] = the initial values
+
+
+def _advance(secs):
+    _now[0] += max(0.0, secs)
+
+
+def set_responses(keys, seed=None):
+    # replace the scripted responses, e.g. with the Response column of a csv
+    _responses.clear()
+    _responses.extend(keys)
+    if seed is not None:
+        _random.seed(seed)
+
+
+def set_dialog(fields):
+    # answers of every following dialog, [] for the initial values
+    _dialog[:] = fields
+
+
+def _next_key(keyList):
+    if _responses and (keyList is None or _responses[0] in keyList):
+        return _responses.popleft()
+    if keyList is None or 'f' in keyList or 'j' in keyList:
+        return _random.choice(['f', 'j'])
+    keys = [key for key in keyList if key != 'end']
+    return keys[0] if keys else None
+
+
+if os.environ.get('EP_RESPONSES'):
+    with open(os.environ['EP_RESPONSES']) as response_file:
+        set_responses([line.strip() for line in response_file
+                       if line.strip()])
+
+
+class NullWindow:
+    '''
+    Window without a display, flip() returns the virtual flip time
+    '''
+
+    def __init__(self, size=(800, 600), color=None, fullscr=False,
+                 monitor=None, allowGUI=True, units='norm', **kwargs):
+        self.size = size
+        self.color = color
+        self.monitor = monitor
+        self.units = units
+        self.monitorFramePeriod = 1.0 / refresh_rate
+        self.flip_count = 0
+        self.draw_count = 0
+        self._on_flip = []
+
+    def getActualFrameRate(self, **kwargs):
+        return refresh_rate
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._on_flip.append((function, args, kwargs))
+
+    def flip(self, clearBuffer=True):
+        # move the clock to the start of the next frame
+        frames = int(_now[0] / self.monitorFramePeriod + 1e-9) + 1
+        _now[0] = frames * self.monitorFramePeriod
+        self.flip_count += 1
+        for function, args, kwargs in self._on_flip:
+            function(*args, **kwargs)
+        self._on_flip = []
+        return _now[0]
+
+    def close(self):
+        pass
+
+
+class NullStim:
+    '''
+    Any visual stimulus, keeps its attributes and counts its draws
+    setX(value) calls are stored as the attribute x
+    '''
+
+    def __init__(self, win=None, **kwargs):
+        self.win = win
+        self.__dict__.update(kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('set') and len(name) > 3:
+            attribute = name[3].lower() + name[4:]
+
+            def setter(value, *args, **kwargs):
+                setattr(self, attribute, value)
+            return setter
+        raise AttributeError(name)
+
+    def draw(self, win=None):
+        (win or self.win).draw_count += 1
+
+
+class NullMonitor(NullStim):
+
+    def __init__(self, name=None, **kwargs):
+        NullStim.__init__(self, name=name, **kwargs)
+
+
+class NullCountdownTimer:
+
+    def __init__(self, start=0):
+        self._end = _now[0] + start
+
+    def getTime(self):
+        return self._end - _now[0]
+
+    def reset(self, t=0):
+        self._end = _now[0] + t
+
+
+class NullClock:
+
+    def __init__(self):
+        self._start = _now[0]
+
+    def getTime(self, applyZero=True):
+        return _now[0] - self._start
+
+    def reset(self, newT=0.0):
+        self._start = _now[0] - newT
+
+
+class NullDlg:
+    '''
+    Observer's info dialog, every field keeps its initial value
+    (or first choice), empty fields are filled with 'null',
+    or the answers given to set_dialog()
+    '''
+
+    def __init__(self, title='', **kwargs):
+        self.fields = []
+        self.OK = True
+
+    def addText(self, text, **kwargs):
+        pass
+
+    def addField(self, label, initial='', choices=None, **kwargs):
+        if choices:
+            self.fields.append(choices[0])
+        else:
+            self.fields.append(initial if initial else 'null')
+
+    def show(self):
+        if _dialog:
+            return list(_dialog)
+        return list(self.fields)
+
+
+class NullKeyPress:
+
+    def __init__(self, name, tDown, rt):
+        self.name = name
+        self.tDown = tDown
+        self.rt = rt
+        self.duration = None
+
+
+class NullKeyboard:
+    '''
+    Background keyboard, the scripted key is pressed response_time
+    (virtual) seconds after the events were cleared
+    '''
+
+    def __init__(self, **kwargs):
+        self.clock = NullClock()
+        self._press_time = None
+
+    def clearEvents(self, eventType=None):
+        self._press_time = _now[0] + response_time
+
+    def getKeys(self, keyList=None, waitRelease=True, clear=True):
+        if self._press_time is None:
+            self.clearEvents()
+        if _now[0] < self._press_time:
+            return []
+        name = _next_key(keyList)
+        if name is None:  # only 'end' is accepted, never pressed
+            return []
+        key = NullKeyPress(name, self._press_time,
+                           self._press_time - self.clock._start)
+        if clear:
+            self._press_time = None
+        return [key]
+
+
+def _wait(secs, hogCPUperiod=0.2):
+    _advance(secs)
+
+
+def _get_time(applyZero=True):
+    return _now[0]
+
+
+def _wait_keys(maxWait=float('inf'), keyList=None, timeStamped=False,
+               clearEvents=True, **kwargs):
+    _advance(min(response_time, maxWait))
+    key = _next_key(keyList)
+    if timeStamped:
+        return [(key, _now[0])]
+    return [key]
+
+
+def _get_keys(keyList=None, timeStamped=False, **kwargs):
+    # skip the self-terminated breaks, nothing else is pressed
+    if keyList is not None and 'space' in keyList:
+        return ['space']
+    return []
+
+
+def _file_save_dlg(initFileName='', prompt='', **kwargs):
+    return initFileName
+
+
+visual = SimpleNamespace(Window=NullWindow,
+                         Rect=NullStim,
+                         Circle=NullStim,
+                         Polygon=NullStim,
+                         ShapeStim=NullStim,
+                         GratingStim=NullStim,
+                         ImageStim=NullStim,
+                         ElementArrayStim=NullStim,
+                         TextStim=NullStim)
+event = SimpleNamespace(waitKeys=_wait_keys,
+                        getKeys=_get_keys,
+                        clearEvents=lambda eventType=None: None)
+monitors = SimpleNamespace(Monitor=NullMonitor)
+core = SimpleNamespace(wait=_wait,
+                       getTime=_get_time,
+                       Clock=NullClock,
+                       CountdownTimer=NullCountdownTimer,
+                       quit=lambda: None)
+logging = SimpleNamespace(CRITICAL=50,
+                          console=SimpleNamespace(
+                              setLevel=lambda level: None))
+gui = SimpleNamespace(Dlg=NullDlg,
+                      fileSaveDlg=_file_save_dlg)
+keyboard = SimpleNamespace(Keyboard=NullKeyboard)
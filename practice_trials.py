@@ -15,7 +15,11 @@ isi blank screen: 500ms
 from datetime import datetime
 import numpy as np
 import os
-from psychopy import visual, event, monitors, core, logging
+from backends import visual, event, core, logging
+from engine import TrialEngine, fixation, gaborset, postcue, precue
+from session import Session
+from stimuli import pos_to_coordinate
+from trial_design import build_layouts, build_triallist, trial_dtype
 import sys
 
 '''
@@ -23,47 +27,34 @@ variables to calibrate the monitor
 line_width_in_pixel is only used in the line width of the
 precue and postcue, psychopy not supported in deg units
 The border width of the circle is 0.2 visual angle
+#
+The monitor, timing & design values come from a profile (config.py),
+e.g. python practice_trials.py --profile home
+Nothing is opened on import, main() creates the session (see session.py)
 '''
+session = None  # the running PracticeSession, created by main()
+
+
+class PracticeSession(Session):
+    '''
+    Practice trial list & the walkthrough layout, on top of the window &
+    stimuli of a Session
+    '''
+
+    def __init__(self, config=None):
+        Session.__init__(self, config)
+        config = self.config
+        # generate the trial list with a single random permutation
+        self.triallist = build_triallist(config['conditions'],
+                                         config['set_orientations'],
+                                         config['cued_orientations'],
+                                         n_positions=2)
+        # 9-patch positions & orientations of every trial, and of the
+        # walkthrough
+        self.layouts = build_layouts(self.triallist)
+        self.tutorial_layout = build_layouts(
+            np.array([(1, 30, 30, 1)], dtype=trial_dtype))[0]
 
-# Setting for the 2 Monitors in RLG307
-monitor_name = 'RLG307'
-view_distance = 60
-screen_width = 59.8
-screen_resolution = [3840,2160]
-line_width_in_pixel = 13
-
-# Setting for Home Monitor
-# monitor_name = 'testMonitor'
-# view_distance = 60
-# screen_width = 47.5
-# screen_resolution = [1680,1050]
-# line_width_in_pixel = 7
-
-# # declare timing variables
-fixation_time = 0.25
-precue_time = 0.75
-gaborset_time = 0.2
-blankscreen_time = 0.4
-feedback_screen_time = 1
-isi_time = 0.5
-
-# declare variables for trial generations
-No_of_Trials = 40
-conditions = [1,2,3,4]
-set_orientations = [0,10,-10,20,-20,30,-30]
-cued_orientations = [0,10,-10,20,-20,30,-30]
-positions = [1,2,3,4,5,6,7,8,9]
-
-# generate the trial list and randomly shuffle
-triallist = []
-for condition in conditions:
-    for set_orientation in set_orientations:
-        for cued_orientation in cued_orientations:
-            np.random.shuffle(positions)
-            for position in positions[0:2]:
-                trial = [condition, set_orientation, cued_orientation, position]
-                triallist.append(trial)
-                np.random.shuffle(triallist)
 
 # Some Tutorial Text used in the Walkthrough
 fixation_edu = "\
@@ -104,22 +95,16 @@ You're doing great, Let's move on to the next walkthrough.\n\n\
 Enter -- Goto next walkthrough.\
 "
 
-# clear command output and start logging
-os.system('cls' if os.name == 'ht' else 'clear')
-logging.console.setLevel(logging.CRITICAL)
-print("**************************************")
-print("PRACTICE TRIAL - NO SAVE")
-print("PSYCHOPY LOGGING set to : CRITICAL")
-print(datetime.now())
-print("**************************************")
 
-# calibrating monitor and creating window for experiment
-mon = monitors.Monitor(monitor_name)
-mon.setWidth(screen_width)
-mon.setDistance(view_distance)
-win = visual.Window(size=screen_resolution, color='#C0C0C0',
-                    fullscr=True, monitor=mon, allowGUI = True
-                    )
+def start_logging():
+    # clear command output and start logging
+    os.system('cls' if os.name == 'ht' else 'clear')
+    logging.console.setLevel(logging.CRITICAL)
+    print("**************************************")
+    print("PRACTICE TRIAL - NO SAVE")
+    print("PSYCHOPY LOGGING set to : CRITICAL")
+    print(datetime.now())
+    print("**************************************")
 
 
 def instruction():
@@ -142,239 +127,24 @@ Press Spacebar to Start the Walkthrough and Tutorial Trials. \n\
 Press 'End' if you want to Terminate anytime.\
 "
 
-    instruct = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+    instruct = visual.TextStim(win = session.win, text = ' ',
+                               font = 'Times New Roman',
                                pos = (0,0), color = 'black', units = 'deg',
                                height = 0.9, wrapWidth=26
                                )
     instruct.setText(instruct_text)
     instruct.draw()
-    win.flip()
+    session.win.flip()
     instructresp = event.waitKeys(maxWait=1000, keyList=['end','space'],
                                   clearEvents=True
                                   )
     if 'space' in instructresp:
         pass
     elif 'end' in instructresp:
-        win.close()
+        session.win.close()
         sys.exit()
 
 
-def fixation():
-    # creating and drawing fixation cross to memeory
-    fix_hori = visual.Rect(win = win, width=0.9, height=0.1, units='deg',
-                           lineColor='black', fillColor='black', pos=(0,0)
-                           )
-    fix_vert = visual.Rect(win = win, width=0.1, height=0.9, units='deg',
-                           lineColor='black', fillColor='black', pos=(0,0)
-                           )
-    fix_hori.draw()
-    fix_vert.draw()
-
-
-def pos_to_coordinate(position):
-    '''
-    Dictionary to convert position code to coordinates,
-    Position Code Refer below
-    (1,2,3)
-    (4,5,6)
-    (7,8,9)
-    '''
-    return {1: (-1.4142, 1.4142),
-            2: (0, 2),
-            3: (1.4142, 1.4142),
-            4: (-2, 0),
-            5: (0,0),
-            6: (2, 0),
-            7: (-1.4142, -1.4142),
-            8: (0, -2),
-            9: (1.4142, -1.4142)}.get(position)
-
-
-def precue(condition, position):
-    """
-    Creating and drawing the pre-cue circle to memory
-    Condition 1 = single pre-cue congruent trial
-    Condition 2 = single pre-cue incongruent trial
-    Condition 3 = ensemble pre-cue congruent trial
-    Condition 4 = ensemble pre-cue incongruent trial
-    #
-    Condition 1 & 2 --> Return single pre-cue
-    Condition 3 & 4 --> Return ensemble pre-cue
-    """
-    singleprecue = visual.Circle(win=win, units = 'deg', radius=0.9,
-                                 edges=1000, fillColor=None,
-                                 lineColor='black',
-                                 lineWidth=line_width_in_pixel, opacity=1
-                                 )
-    setprecue = visual.Circle(win=win, units = 'deg', pos=(0,0), radius=2.85,
-                              edges=1000, fillColor=None,
-                              lineColor='black',
-                              lineWidth=line_width_in_pixel, opacity=1
-                              )
-
-    if (condition == 1 or condition == 2):
-        singleprecue.pos = pos_to_coordinate(position)
-        singleprecue.draw()
-    elif (condition == 3 or condition == 4):
-        setprecue.draw()
-
-
-def gaborset(set_orientation, cued_orientation, position):
-    '''
-    creating the 9-gabor set, one central grating surrounded by
-    8 flanker gratings, use pos_to_coordinate dict to convert
-    only draw the set to memory
-    '''
-    grating = visual.GratingStim(win = win, units= 'deg',tex='sin',
-                                 mask='gauss', ori=0, pos=(0, 0),
-                                 size=(1.6,1.6), sf=3, opacity = 1,
-                                 blendmode='avg', texRes=128,
-                                 interpolate=True, depth=0.0
-                                 )
-    '''
-    Construction of the GaborSet Arrays
-    And Randomly Shuffle it
-    '''
-
-    pos_array = [1,2,3,4,5,6,7,8,9]
-    np.random.shuffle(pos_array)
-
-    ori_array = []
-    pos_ori_array = np.array([5,10,15])
-    neg_ori_array = -pos_ori_array
-
-    if set_orientation > 0:  # postive ensemble set
-        pos_ori_array = pos_ori_array + 2 * set_orientation
-        neg_ori_array = neg_ori_array + set_orientation
-    elif set_orientation < 0:  # negative ensemble set
-        pos_ori_array = pos_ori_array + set_orientation
-        neg_ori_array = neg_ori_array + 2 * set_orientation
-    else:  # neutral set (0)
-        pass
-
-    if cued_orientation == 0:  # To prevent 3 0s when the cued is 0
-        ori_array = [0,
-                     cued_orientation + 15,
-                     -cued_orientation - 15,
-                     pos_ori_array[0],
-                     pos_ori_array[1],
-                     pos_ori_array[2],
-                     neg_ori_array[0],
-                     neg_ori_array[1],
-                     neg_ori_array[2],
-                     ]
-
-    else:
-        ori_array = [0,
-                     cued_orientation,
-                     -cued_orientation,
-                     pos_ori_array[0],
-                     pos_ori_array[1],
-                     pos_ori_array[2],
-                     neg_ori_array[0],
-                     neg_ori_array[1],
-                     neg_ori_array[2],
-                     ]
-
-    np.random.shuffle(ori_array)
-
-    '''
-    Draw the Cued_Orientation and Set position to memory,
-    remove the element in the array by value
-    '''
-    grating.setOri(cued_orientation)
-    grating.pos = pos_to_coordinate(position)
-    grating.draw()
-    pos_array.remove(position)
-    ori_array.remove(cued_orientation)
-
-    '''
-    this for-loop will set position & orientation from the arrays,
-    draw it to memory, and remove drawn element from the arrays
-    '''
-    for z in range(8):
-        grating.pos = pos_to_coordinate(pos_array[0])
-        grating.setOri(ori_array[0])
-        grating.draw()
-        del(pos_array[0])
-        del(ori_array[0])
-
-
-def postcue(condition, position):
-    """
-    Creating and drawing the post-cue circle to memory
-    Condition 1 = single pre-cue congruent trial
-    Condition 2 = single pre-cue incongruent trial
-    Condition 3 = ensemble pre-cue congruent trial
-    Condition 4 = ensemble pre-cue incongruent trial
-    #
-    Condition 1 & 4--> Return single post-cue
-    Condition 2 & 3 --> Return ensemble post-cue
-    """
-
-    singlepostcue = visual.Circle(win=win, units = 'deg', radius=0.9,
-                                  edges=1000, fillColor=None,
-                                  lineColor='black',
-                                  lineWidth=line_width_in_pixel,
-                                  opacity=1
-                                  )
-    setpostcue = visual.Circle(win=win, units = 'deg', pos=(0,0), radius=2.85,
-                               edges=1000, fillColor=None,
-                               lineColor='black',
-                               lineWidth=line_width_in_pixel,
-                               opacity=1
-                               )
-
-    if (condition == 1 or condition == 4):
-        singlepostcue.pos = pos_to_coordinate(position)
-        singlepostcue.draw()
-    elif (condition == 2 or condition == 3):
-        setpostcue.draw()
-
-
-def feedback(condition, set_orientation, cued_orientation, response):
-    # Create Feedback for Practice Trial and draw to memory
-    '''
-    Draw a green circle for correct, red for wrong
-    if 0 in ori: always correct
-    '''
-    correct_fb = visual.Circle(win=win, units = 'deg', pos=(0,0), radius=5.5,
-                               edges=1000, fillColor='#ADFF2F',
-                               lineColor='#ADFF2F',
-                               lineWidth=line_width_in_pixel,
-                               opacity=1)
-    wrong_fb = visual.Circle(win=win, units = 'deg', pos=(0,0), radius=5.5,
-                             edges=1000, fillColor='#FF0000',
-                             lineColor='#FF0000',
-                             lineWidth=line_width_in_pixel,
-                             opacity=1)
-
-    if 'f' in response:
-        resp_bin = 0
-    else:
-        resp_bin = 1
-
-    if condition == 1 or condition == 4:
-        if cued_orientation > 0:
-            answer = 1
-        elif cued_orientation == 0:
-            answer = resp_bin
-        else:
-            answer = 0
-    else:
-        if set_orientation > 0:
-            answer = 1
-        elif set_orientation == 0:
-            answer = resp_bin
-        else:
-            answer = 0
-
-    if resp_bin == answer:
-        correct_fb.draw()
-    else:
-        wrong_fb.draw()
-
-
 def debriefing():
     #  Debriefing Note
     debrief_text = \
@@ -382,25 +152,27 @@ def debriefing():
 End of Practice Trials, Take a Break & Get Ready for the Test Trials.\
 "
 
-    debrief = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+    debrief = visual.TextStim(win = session.win, text = ' ',
+                              font = 'Times New Roman',
                               pos = (0,0), color = 'black', units = 'deg',
                               height = 0.9, wrapWidth=20
                               )
     debrief.setText(debrief_text)
     debrief.draw()
-    win.flip()
+    session.win.flip()
     core.wait(5)
 
 
 def tutor_s_s():
-    edu_text = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+    edu_text = visual.TextStim(win = session.win, text = ' ',
+                               font = 'Times New Roman',
                                pos = (0,-8), color = 'black', units = 'deg',
                                height = 0.9, wrapWidth=20
                                )
-    square = visual.Polygon(win=win, units='deg', edges=4, radius = 0.7,
-                            color = 'red'
+    square = visual.Polygon(win=session.win, units='deg', edges=4,
+                            radius = 0.7, color = 'red'
                             )
-    edu_gabor = visual.GratingStim(win = win, units= 'deg',tex='sin',
+    edu_gabor = visual.GratingStim(win = session.win, units= 'deg',tex='sin',
                                    mask='gauss',
                                    size=(3.6,3.6), sf=1, opacity = 1,
                                    blendmode='avg', texRes=128,
@@ -408,83 +180,83 @@ def tutor_s_s():
                                    )
 
     while True:
-        fixation()
+        fixation(session.stim)
         edu_text.setText(fixation_edu)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(1,1)
+        precue(session.stim, 1, 1)
         edu_text.setText(precue_edu_1)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(1,1)
+        precue(session.stim, 1, 1)
         square.pos = pos_to_coordinate(1)
         square.draw()
         edu_text.setText(precue_edu_2)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        gaborset(30,30,1)
+        gaborset(session.stim, session.tutorial_layout)
         edu_text.setText(gabor_edu_1)
         edu_text.draw()
-        win.flip(clearBuffer = False)
+        session.win.flip(clearBuffer = False)
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(1,1)
+        precue(session.stim, 1, 1)
         edu_text.setText(gabor_edu_2)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        postcue(1,1)
+        postcue(session.stim, 1, 1)
         edu_text.setText(postcue_edu)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
@@ -502,86 +274,63 @@ def tutor_s_s():
         edu_gabor.setOri(45)
         edu_gabor.pos = (5,0)
         edu_gabor.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, clearEvents=True,
                             keyList=['return', 'end', 'backspace', 'f', 'j'],
                             )
         if any(keylist in go for keylist in ("f", "j", "return")):
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
         elif 'backspace' in go:
             return tutor_s_s()
 
 
-def practice_s_s():
-    edu_text = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+def tutorial_trials(condition):
+    '''
+    Up to 10 practice trials of one condition after its walkthrough,
+    'return' skips the rest, then go on to the next walkthrough
+    '''
+    edu_text = visual.TextStim(win = session.win, text = ' ',
+                               font = 'Times New Roman',
                                pos = (0,-8), color = 'black', units = 'deg',
                                height = 0.9, wrapWidth=20
                                )
 
-    for i in range(0, 10):
-        # fixation screen
-        fixation()
-        win.flip()
-        core.wait(fixation_time)
-        # precue screen
-        precue(1, triallist[i][3])
-        win.flip()
-        core.wait(precue_time)
-        # set screen
-        gaborset(triallist[i][1], triallist[i][2], triallist[i][3])
-        win.flip()
-        core.wait(gaborset_time)
-        # blankscreen
-        win.flip()
-        core.wait(blankscreen_time)
-        # postcue screen
-        postcue(1, triallist[i][3])
-        win.flip()
-
-        resp = event.waitKeys(maxWait=1000, keyList=['return','end','f','j'],
-                              clearEvents=True)
-
-        if 'end' in resp:
-            # Exit Key
-            win.close()
-            sys.exit()
-
-        elif 'return' in resp:
-            break
-
-        elif any(keylist in resp for keylist in ("f", "j")):
-            # Feedback Screen
-            feedback(1, triallist[i][1], triallist[i][2], resp)
-            win.flip()
-            core.wait(feedback_screen_time)
-            # ISI
-            win.flip()
-            core.wait(isi_time)
+    if TrialEngine(session, 'tutorial').run(
+            0, len(session.triallist), condition=condition) == 'end':
+        # Exit Key
+        session.win.close()
+        sys.exit()
 
     edu_text.setText(next_text)
     edu_text.draw()
-    win.flip()
+    session.win.flip()
     go = event.waitKeys(maxWait=1000, keyList=['return', 'end'],
                         clearEvents=True)
     if 'return' in go:
         pass
     else:
-        win.close()
+        session.win.close()
         sys.exit()
 
 
+def practice_s_s():
+    # single pre-cue, single post-cue (condition 1) tutorial trials
+    tutorial_trials(1)
+
+
 def tutor_e_e():
-    edu_text = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+    edu_text = visual.TextStim(win = session.win, text = ' ',
+                               font = 'Times New Roman',
                                pos = (0,-8), color = 'black', units = 'deg',
                                height = 0.9, wrapWidth=20
                                )
-    square = visual.Polygon(win=win, units='deg', edges=4, radius = 2.8,
-                            color = 'red'
+    square = visual.Polygon(win=session.win, units='deg', edges=4,
+                            radius = 2.8, color = 'red'
                             )
-    edu_gabor = visual.GratingStim(win = win, units= 'deg',tex='sin',
+    edu_gabor = visual.GratingStim(win = session.win, units= 'deg',tex='sin',
                                    mask='gauss',
                                    size=(3.6,3.6), sf=1, opacity = 1,
                                    blendmode='avg', texRes=128,
@@ -589,83 +338,83 @@ def tutor_e_e():
                                    )
 
     while True:
-        fixation()
+        fixation(session.stim)
         edu_text.setText(fixation_edu)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(3,1)
+        precue(session.stim, 3, 1)
         edu_text.setText(precue_edu_1)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(3,1)
+        precue(session.stim, 3, 1)
         square.pos = [0,0]
         square.draw()
         edu_text.setText(precue_edu_2)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        gaborset(30,30,1)
+        gaborset(session.stim, session.tutorial_layout)
         edu_text.setText(gabor_edu_1)
         edu_text.draw()
-        win.flip(clearBuffer = False)
+        session.win.flip(clearBuffer = False)
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(3,1)
+        precue(session.stim, 3, 1)
         edu_text.setText(gabor_edu_2)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        postcue(3,1)
+        postcue(session.stim, 3, 1)
         edu_text.setText(postcue_edu)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
@@ -683,86 +432,34 @@ def tutor_e_e():
         edu_gabor.setOri(45)
         edu_gabor.pos = (5,0)
         edu_gabor.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, clearEvents=True,
                             keyList=['return', 'end', 'backspace', 'f', 'j'],
                             )
         if any(keylist in go for keylist in ("f", "j", "return")):
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
         elif 'backspace' in go:
             return tutor_e_e()
 
 
 def practice_e_e():
-    edu_text = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
-                               pos = (0,-8), color = 'black', units = 'deg',
-                               height = 0.9, wrapWidth=20
-                               )
-
-    for i in range(0, 10):
-        # fixation screen
-        fixation()
-        win.flip()
-        core.wait(fixation_time)
-        # precue screen
-        precue(3, triallist[i][3])
-        win.flip()
-        core.wait(precue_time)
-        # set screen
-        gaborset(triallist[i][1], triallist[i][2], triallist[i][3])
-        win.flip()
-        core.wait(gaborset_time)
-        # blankscreen
-        win.flip()
-        core.wait(blankscreen_time)
-        # postcue screen
-        postcue(3, triallist[i][3])
-        win.flip()
-
-        resp = event.waitKeys(maxWait=1000, keyList=['return','end','f','j'],
-                              clearEvents=True)
-
-        if 'end' in resp:
-            # Exit Key
-            win.close()
-            sys.exit()
-
-        elif 'return' in resp:
-            break
-
-        elif any(keylist in resp for keylist in ("f", "j")):
-            # Feedback Screen
-            feedback(3, triallist[i][1], triallist[i][2], resp)
-            win.flip()
-            core.wait(feedback_screen_time)
-            # ISI
-            win.flip()
-            core.wait(isi_time)
-
-    edu_text.setText(next_text)
-    edu_text.draw()
-    win.flip()
-    go = event.waitKeys(maxWait=1000, keyList=['return', 'end'],
-                        clearEvents=True)
-    if 'return' in go:
-        pass
-    else:
-        win.close()
-        sys.exit()
+    # ensemble pre-cue, ensemble post-cue (condition 3) tutorial trials
+    tutorial_trials(3)
 
 
 def tutor_s_e():
-    edu_text = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+    edu_text = visual.TextStim(win = session.win, text = ' ',
+                               font = 'Times New Roman',
                                pos = (0,-8), color = 'black', units = 'deg',
                                height = 0.9, wrapWidth=20
                                )
-    square = visual.Polygon(win=win, units='deg', edges=4, radius = 0.7,
-                            color = 'red'
+    square = visual.Polygon(win=session.win, units='deg', edges=4,
+                            radius = 0.7, color = 'red'
                             )
-    edu_gabor = visual.GratingStim(win = win, units= 'deg',tex='sin',
+    edu_gabor = visual.GratingStim(win = session.win, units= 'deg',tex='sin',
                                    mask='gauss',
                                    size=(3.6,3.6), sf=1, opacity = 1,
                                    blendmode='avg', texRes=128,
@@ -770,84 +467,84 @@ def tutor_s_e():
                                    )
 
     while True:
-        fixation()
+        fixation(session.stim)
         edu_text.setText(fixation_edu)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(2,1)
+        precue(session.stim, 2, 1)
         edu_text.setText(precue_edu_1)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(2,1)
+        precue(session.stim, 2, 1)
         square.pos = pos_to_coordinate(1)
         square.draw()
         edu_text.setText(precue_edu_2)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        gaborset(30,30,1)
+        gaborset(session.stim, session.tutorial_layout)
         edu_text.setText(gabor_edu_1)
         edu_text.draw()
-        win.flip(clearBuffer = False)
+        session.win.flip(clearBuffer = False)
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(2,1)
+        precue(session.stim, 2, 1)
         edu_text.setText(gabor_edu_2)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        postcue(2,1)
+        postcue(session.stim, 2, 1)
         edu_text.setText(postcue_edu)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, clearEvents=True,
                             keyList=['return', 'end', 'backspace', 'f', 'j'],
                             )
         if any(keylist in go for keylist in ("f", "j", "return")):
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
@@ -865,85 +562,33 @@ def tutor_s_e():
         edu_gabor.setOri(45)
         edu_gabor.pos = (5,0)
         edu_gabor.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['return', 'end', 'backspace'],
                             clearEvents=True)
         if 'return' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
         elif 'backspace' in go:
             return tutor_s_e()
 
 
 def practice_s_e():
-    edu_text = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
-                               pos = (0,-8), color = 'black', units = 'deg',
-                               height = 0.9, wrapWidth=20
-                               )
-
-    for i in range(0, 10):
-        # fixation screen
-        fixation()
-        win.flip()
-        core.wait(fixation_time)
-        # precue screen
-        precue(2, triallist[i][3])
-        win.flip()
-        core.wait(precue_time)
-        # set screen
-        gaborset(triallist[i][1], triallist[i][2], triallist[i][3])
-        win.flip()
-        core.wait(gaborset_time)
-        # blankscreen
-        win.flip()
-        core.wait(blankscreen_time)
-        # postcue screen
-        postcue(2, triallist[i][3])
-        win.flip()
-
-        resp = event.waitKeys(maxWait=1000, keyList=['return','end','f','j'],
-                              clearEvents=True)
-
-        if 'end' in resp:
-            # Exit Key
-            win.close()
-            sys.exit()
-
-        elif 'return' in resp:
-            break
-
-        elif any(keylist in resp for keylist in ("f", "j")):
-            # Feedback Screen
-            feedback(2, triallist[i][1], triallist[i][2], resp)
-            win.flip()
-            core.wait(feedback_screen_time)
-            # ISI
-            win.flip()
-            core.wait(isi_time)
-
-    edu_text.setText(next_text)
-    edu_text.draw()
-    win.flip()
-    go = event.waitKeys(maxWait=1000, keyList=['return', 'end'],
-                        clearEvents=True)
-    if 'return' in go:
-        pass
-    else:
-        win.close()
-        sys.exit()
+    # single pre-cue, ensemble post-cue (condition 2) tutorial trials
+    tutorial_trials(2)
 
 
 def tutor_e_s():
-    edu_text = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+    edu_text = visual.TextStim(win = session.win, text = ' ',
+                               font = 'Times New Roman',
                                pos = (0,-8), color = 'black', units = 'deg',
                                height = 0.9, wrapWidth=20
                                )
-    square = visual.Polygon(win=win, units='deg', edges=4, radius = 2.8,
-                            color = 'red'
+    square = visual.Polygon(win=session.win, units='deg', edges=4,
+                            radius = 2.8, color = 'red'
                             )
-    edu_gabor = visual.GratingStim(win = win, units= 'deg',tex='sin',
+    edu_gabor = visual.GratingStim(win = session.win, units= 'deg',tex='sin',
                                    mask='gauss',
                                    size=(3.6,3.6), sf=1, opacity = 1,
                                    blendmode='avg', texRes=128,
@@ -951,83 +596,83 @@ def tutor_e_s():
                                    )
 
     while True:
-        fixation()
+        fixation(session.stim)
         edu_text.setText(fixation_edu)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(4,1)
+        precue(session.stim, 4, 1)
         edu_text.setText(precue_edu_1)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(4,1)
+        precue(session.stim, 4, 1)
         square.pos = [0,0]
         square.draw()
         edu_text.setText(precue_edu_2)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        gaborset(30,30,1)
+        gaborset(session.stim, session.tutorial_layout)
         edu_text.setText(gabor_edu_1)
         edu_text.draw()
-        win.flip(clearBuffer = False)
+        session.win.flip(clearBuffer = False)
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        precue(4,1)
+        precue(session.stim, 4, 1)
         edu_text.setText(gabor_edu_2)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
-        postcue(4,1)
+        postcue(session.stim, 4, 1)
         edu_text.setText(postcue_edu)
         edu_text.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, keyList=['space','end'],
                             clearEvents=True)
         if 'space' in go:
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
 
     while True:
@@ -1045,75 +690,22 @@ def tutor_e_s():
         edu_gabor.setOri(45)
         edu_gabor.pos = (5,0)
         edu_gabor.draw()
-        win.flip()
+        session.win.flip()
         go = event.waitKeys(maxWait=1000, clearEvents=True,
                             keyList=['return', 'end', 'backspace', 'f', 'j'],
                             )
         if any(keylist in go for keylist in ("f", "j", "return")):
             break
         elif 'end' in go:
-            win.close()
+            session.win.close()
             sys.exit()
         elif 'backspace' in go:
             return tutor_e_s()
 
 
 def practice_e_s():
-    edu_text = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
-                               pos = (0,-8), color = 'black', units = 'deg',
-                               height = 0.9, wrapWidth=20
-                               )
-
-    for i in range(0, 10):
-        # fixation screen
-        fixation()
-        win.flip()
-        core.wait(fixation_time)
-        # precue screen
-        precue(4, triallist[i][3])
-        win.flip()
-        core.wait(precue_time)
-        # set screen
-        gaborset(triallist[i][1], triallist[i][2], triallist[i][3])
-        win.flip()
-        core.wait(gaborset_time)
-        # blankscreen
-        win.flip()
-        core.wait(blankscreen_time)
-        # postcue screen
-        postcue(4, triallist[i][3])
-        win.flip()
-
-        resp = event.waitKeys(maxWait=1000, keyList=['return','end','f','j'],
-                              clearEvents=True)
-
-        if 'end' in resp:
-            # Exit Key
-            win.close()
-            sys.exit()
-
-        elif 'return' in resp:
-            break
-
-        elif any(keylist in resp for keylist in ("f", "j")):
-            # Feedback Screen
-            feedback(4, triallist[i][1], triallist[i][2], resp)
-            win.flip()
-            core.wait(feedback_screen_time)
-            # ISI
-            win.flip()
-            core.wait(isi_time)
-
-    edu_text.setText(next_text)
-    edu_text.draw()
-    win.flip()
-    go = event.waitKeys(maxWait=1000, keyList=['return', 'end'],
-                        clearEvents=True)
-    if 'return' in go:
-        pass
-    else:
-        win.close()
-        sys.exit()
+    # ensemble pre-cue, single post-cue (condition 4) tutorial trials
+    tutorial_trials(4)
 
 
 def checkpoint():
@@ -1124,24 +716,29 @@ Now, We will have 40 practice trials before the actual experiment.\n\n\n\
 Press F or J to start the practice trial.\n\
 "
 
-    check = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+    check = visual.TextStim(win = session.win, text = ' ',
+                            font = 'Times New Roman',
                             pos = (0,0), color = 'black', units = 'deg',
                             height = 0.9, wrapWidth=26
                             )
     check.setText(checkpoint_text)
     check.draw()
-    win.flip()
+    session.win.flip()
     checkresp = event.waitKeys(maxWait=1000, keyList=['end','f','j'],
                                clearEvents=True
                                )
     if any(keylist in checkresp for keylist in ("f", "j")):
         pass
     elif 'end' in checkresp:
-        win.close()
+        session.win.close()
         sys.exit()
 
 
-def main():
+def main(config=None):
+    global session
+    start_logging()
+    session = PracticeSession(config)
+    session.open_window(cue_fill_color=None)
     instruction()
     tutor_s_s()
     practice_s_s()
@@ -1153,51 +750,20 @@ def main():
     practice_e_s()
     checkpoint()
     '''
-    This is the main random trial loop
+    This is the main random trial loop (see engine.py)
     '''
-    for i in range(0, No_of_Trials):
-        # fixation screen
-        fixation()
-        win.flip()
-        core.wait(fixation_time)
-        # precue screen
-        precue(triallist[i][0], triallist[i][3])
-        win.flip()
-        core.wait(precue_time)
-        # set screen
-        gaborset(triallist[i][1], triallist[i][2], triallist[i][3])
-        win.flip()
-        core.wait(gaborset_time)
-        # blankscreen
-        win.flip()
-        core.wait(blankscreen_time)
-        # postcue screen
-        postcue(triallist[i][0], triallist[i][3])
-        win.flip()
-
-        resp = event.waitKeys(maxWait=1000, keyList=['end','f','j'],
-                              clearEvents=True)
-
-        if 'end' in resp:
-            # Exit Key
-            win.close()
-            sys.exit()
-
-        elif any(keylist in resp for keylist in ("f", "j")):
-            # Feedback Screen
-            feedback(triallist[i][0], triallist[i][1], triallist[i][2], resp)
-            win.flip()
-            core.wait(feedback_screen_time)
-            # ISI
-            win.flip()
-            core.wait(isi_time)
+    if TrialEngine(session, 'practice').run(
+            0, session.config['No_of_Practice_Trials']) == 'end':
+        # Exit Key
+        session.win.close()
+        sys.exit()
     '''
     The main trial loop Ends Here.
     '''
 
     # Debrifing & close all
     debriefing()
-    win.close()
+    session.win.close()
     sys.exit()
 
 
@@ -0,0 +1,207 @@
+'''
+Frame-counted presentation of the trial screens
+#
+The timing constants (in seconds) are turned into a number of frames from
+the measured refresh rate, and every screen is drawn for exactly that many
+flips instead of flip + core.wait. Each flip timestamp is kept in the
+flip log, so the timing of a whole session can be checked afterwards.
+#
+With a TelemetryBuffer (telemetry.py) the requested vs. actual onset and
+duration of every screen is also recorded, a screen ends at the onset
+flip of the next screen (or at end_screen(), e.g. before a break).
+#
+calibrate() measures the frame interval when the window opens: blank
+flips give the refresh rate the durations are converted with, flips of
+the heaviest screen (the 9-Gabor set) show whether it is drawn within
+1 frame on this rig.
+'''
+
+import csv
+import math
+import os
+
+import numpy as np
+
+calibration_columns = ['Date', 'Refresh_Rate', 'Frame_ms', 'Jitter_ms',
+                       'Max_Frame_ms', 'Screen_Max_Frame_ms',
+                       'Screen_Late_Frames', 'Flips']
+
+
+class FrameScheduler:
+    '''
+    Draw each screen for an exact number of flips and log every flip
+    win = the psychopy window
+    refresh_rate = frames per second, measured from the window if None
+    telemetry = optional TelemetryBuffer for the screen timing,
+    trial = trial number the screens are recorded under
+    '''
+
+    def __init__(self, win, refresh_rate=None, telemetry=None):
+        self.win = win
+        if refresh_rate is None:
+            refresh_rate = win.getActualFrameRate()
+        if refresh_rate is None:
+            # measurement was unstable, fall back to the nominal period
+            refresh_rate = 1.0 / win.monitorFramePeriod
+            print("Refresh rate not measurable, using nominal {:.2f} Hz"
+                  .format(refresh_rate))
+        self.refresh_rate = refresh_rate
+        self.frame_duration = 1.0 / refresh_rate
+        self.flip_log = []  # (screen, frame in screen, flip time)
+        self.telemetry = telemetry
+        self.trial = 0
+        self._open_screen = None  # telemetry of the screen on display
+        self._planned_end = None  # requested end of the screen on display
+
+    def frames(self, duration):
+        # number of flips for a duration in seconds, at least 1 frame
+        return max(1, int(round(duration * self.refresh_rate)))
+
+    def flip(self, screen, draw=None):
+        '''
+        Draw the screen once and flip, used for screens without a fixed
+        duration (e.g. the post-cue waiting for a response)
+        return the flip time
+        '''
+        if draw is not None:
+            draw()
+        flip_time = self.win.flip()
+        self.flip_log.append((screen, 0, flip_time))
+        self._start_screen(screen, flip_time, float('nan'), 1)
+        return flip_time
+
+    def hold(self, screen, draw=None):
+        '''
+        Draw the screen on display once more and flip, e.g. to keep the
+        post-cue on the screen while the response is collected
+        return the flip time
+        '''
+        if draw is not None:
+            draw()
+        flip_time = self.win.flip()
+        frame = self.flip_log[-1][1] + 1 if self.flip_log else 0
+        self.flip_log.append((screen, frame, flip_time))
+        return flip_time
+
+    def present(self, screen, draw, duration):
+        '''
+        Draw the screen on every flip for exactly frames(duration) flips
+        draw = function drawing the screen to memory, None for a blank
+        return the flip time of the screen onset
+        '''
+        onset = None
+        frames = self.frames(duration)
+        for frame in range(frames):
+            if draw is not None:
+                draw()
+            flip_time = self.win.flip()
+            self.flip_log.append((screen, frame, flip_time))
+            if onset is None:
+                onset = flip_time
+                self._start_screen(screen, onset, duration, frames)
+        return onset
+
+    def _start_screen(self, screen, onset, duration, frames):
+        # the previous screen ends at this onset, then this one starts
+        self._end_screen(onset)
+        requested_onset = onset if self._planned_end is None \
+            else self._planned_end
+        self._open_screen = (self.trial, screen, requested_onset, onset,
+                             duration, frames)
+        # requested end in whole frames, unknown for untimed screens
+        if math.isnan(duration):
+            self._planned_end = None
+        else:
+            self._planned_end = requested_onset + \
+                frames * self.frame_duration
+
+    def _end_screen(self, end_time):
+        if self._open_screen is not None and self.telemetry is not None:
+            trial, screen, requested_onset, onset, duration, frames = \
+                self._open_screen
+            self.telemetry.record(trial, screen, requested_onset, onset,
+                                  duration, end_time - onset, frames)
+        self._open_screen = None
+
+    def end_screen(self, end_time=None):
+        '''
+        End the screen on display without a next screen (e.g. before a
+        break or at the end), by default at the end of its last frame
+        '''
+        if end_time is None and self.flip_log:
+            end_time = self.flip_log[-1][2] + self.frame_duration
+        self._end_screen(end_time)
+        self._planned_end = None
+
+    def dropped_frames(self):
+        '''
+        count flip intervals longer than 1.5 frames within a screen,
+        the gaps while waiting for a response or in a break are not drops
+        '''
+        dropped = 0
+        for previous, current in zip(self.flip_log[:-1], self.flip_log[1:]):
+            if current[1] > 0 and \
+                    current[2] - previous[2] > 1.5 * self.frame_duration:
+                dropped += 1
+        return dropped
+
+    def save_flip_log(self, file_name):
+        write_flip_log(file_name, self.flip_log)
+
+
+def write_flip_log(file_name, flip_log):
+    '''
+    Append a flip log to a csv file, 1 row per flip, with the header if
+    the file is new (a resumed session adds its flips, from frame 0 again)
+    '''
+    new_file = not os.path.exists(file_name) or \
+        os.path.getsize(file_name) == 0
+    with open(file_name, 'a', newline='') as flip_file:
+        writer = csv.writer(flip_file)
+        if new_file:
+            writer.writerow(['Screen', 'Frame', 'Flip_Time'])
+        writer.writerows(flip_log)
+
+
+def flip_intervals(win, n_flips, draw=None):
+    # intervals of n_flips consecutive flips (s), drawing before each flip
+    times = np.empty(n_flips + 1)
+    for flip in range(n_flips + 1):
+        if draw is not None:
+            draw()
+        times[flip] = win.flip()
+    return np.diff(times)
+
+
+def calibrate(win, draw=None, n_flips=200):
+    '''
+    Measure the frame interval over n_flips blank flips, then over n_flips
+    flips drawing the screen with draw() (e.g. the 9-Gabor set)
+    a screen flip is late when it takes over 1.5 frames
+    return dict of refresh_rate (1 / median blank interval), frame_ms,
+    jitter_ms (sd), max_ms, screen_max_ms, screen_late & flips
+    '''
+    win.flip()  # the first flip waits for the window to be shown
+    blank = flip_intervals(win, n_flips)
+    frame = float(np.median(blank))
+    screen = flip_intervals(win, n_flips, draw)
+    return {'refresh_rate': 1.0 / frame,
+            'frame_ms': frame * 1000,
+            'jitter_ms': float(blank.std()) * 1000,
+            'max_ms': float(blank.max()) * 1000,
+            'screen_max_ms': float(screen.max()) * 1000,
+            'screen_late': int((screen > 1.5 * frame).sum()),
+            'flips': n_flips}
+
+
+def write_calibration(file_name, calibration, date):
+    # append the calibration as 1 csv row, a resumed session adds a row
+    new_file = not os.path.exists(file_name)
+    with open(file_name, 'a', newline='') as calibration_file:
+        writer = csv.writer(calibration_file)
+        if new_file:
+            writer.writerow(calibration_columns)
+        writer.writerow([date, calibration['refresh_rate'],
+                         calibration['frame_ms'], calibration['jitter_ms'],
+                         calibration['max_ms'], calibration['screen_max_ms'],
+                         calibration['screen_late'], calibration['flips']])
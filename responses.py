@@ -0,0 +1,47 @@
+'''
+Keyboard responses timed from the post-cue flip
+#
+The keyboard is psychopy's hardware Keyboard (psychopy.hardware.keyboard),
+which is polled in the background and timestamps every key press (tDown)
+when it happens, not when Python asks for it. While waiting for the
+response the post-cue is drawn & flipped on every frame and the keyboard
+is only checked in between, so the collection never blocks the display.
+#
+latency = rt of the key press: the keyboard clock is reset on the flip of
+the post-cue onset (win.callOnFlip), so the latency is measured on the
+keyboard's own clock and does not depend on the epoch of the flip times
+'''
+
+from backends import keyboard
+
+
+class ResponseCollector:
+    '''
+    Non-blocking response collection with the hardware keyboard
+    scheduler = the FrameScheduler drawing the screen while waiting
+    '''
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.keyboard = keyboard.Keyboard()
+
+    def clear_on_flip(self):
+        # forget the keys pressed before the next flip (the screen onset)
+        # and time the key presses from that flip
+        self.scheduler.win.callOnFlip(self.keyboard.clock.reset)
+        self.scheduler.win.callOnFlip(self.keyboard.clearEvents)
+
+    def collect(self, screen, draw, onset, keyList, maxWait=1000):
+        '''
+        Keep the screen on display until one of keyList is pressed
+        onset = flip time of the screen onset (after clear_on_flip)
+        return (key, latency from onset), (None, None) after maxWait s
+        '''
+        flip_time = onset
+        while flip_time - onset < maxWait:
+            keys = self.keyboard.getKeys(keyList=keyList, waitRelease=False,
+                                         clear=True)
+            if keys:
+                return keys[0].name, keys[0].rt
+            flip_time = self.scheduler.hold(screen, draw)
+        return None, None
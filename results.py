@@ -0,0 +1,180 @@
+'''
+Trial data output of the experiment
+#
+TrialWriter appends every trial to the csv file as soon as the trial
+ends: each row is flushed to the OS right away, so a crash of the
+process (e.g. a segfault of the GL driver) loses at most the trial that
+was running, and the file is fsync-ed every fsync_every rows and on
+close, so a crash of the whole machine loses at most the last few rows.
+completed_trials() counts the trials answered in a file (& cuts the row
+of the stop), so a session can be resumed from the next trial.
+#
+write_columnar() also saves a finished session as a Feather or Parquet
+file (needs pyarrow), with the session info (date, time, name, ...)
+stored once as file metadata instead of on every row, and typed integer
+columns for the trial design and the 9 orientations of the gabor set.
+read_columnar() loads it back.
+'''
+
+import csv
+import json
+import os
+
+# orientation of the patch at position 1-9 in the gabor set of the trial
+orientation_columns = ['Ori_Position_{}'.format(position)
+                       for position in range(1, 10)]
+output_columns = ['Exp_Date', 'Exp_Time', 'Sub_Name', 'Age', 'Gender',
+                  'Dominant_Hand', 'Trial_No', 'Condition',
+                  'Cued_Orientation', 'Set_Orientation', 'Position',
+                  'Response', 'Latency'] + orientation_columns
+session_columns = output_columns[0:6]
+# types of the trial columns in the columnar file
+columnar_types = {'Trial_No': 'int16',
+                  'Condition': 'int8',
+                  'Cued_Orientation': 'int16',
+                  'Set_Orientation': 'int16',
+                  'Position': 'int8',
+                  'Response': 'dictionary',
+                  'Latency': 'float64'}
+columnar_types.update({column: 'int16' for column in orientation_columns})
+
+
+def drop_partial_row(file_name):
+    # cut a last row that was only partly written when the session crashed
+    with open(file_name, 'rb+') as data_file:
+        content = data_file.read()
+        if content and not content.endswith(b'\n'):
+            data_file.truncate(content.rfind(b'\n') + 1)
+
+
+def completed_trials(file_name):
+    '''
+    Number of answered trials ('f' / 'j') at the start of the file (0 if
+    no file), the session resumes after them: the row that stopped the
+    session ('end') & any row after it are cut from the file, so the
+    resumed trials follow the answered ones
+    '''
+    if not os.path.exists(file_name):
+        return 0
+    drop_partial_row(file_name)
+    with open(file_name, 'rb+') as data_file:
+        lines = data_file.read().splitlines(keepends=True)
+        if not lines:
+            return 0
+        response = next(csv.reader([lines[0].decode()])).index('Response')
+        kept = len(lines)
+        for i, line in enumerate(lines[1:], 1):
+            if next(csv.reader([line.decode()]))[response] not in ('f', 'j'):
+                kept = i
+                break
+        data_file.truncate(sum(len(line) for line in lines[:kept]))
+    return kept - 1
+
+
+class TrialWriter:
+    '''
+    Append trial rows to a csv file, writing the header for a new file
+    file_name = csv file, appended to if it already holds trials
+    fsync_every = number of rows between forced writes to disk
+    '''
+
+    def __init__(self, file_name, columns=output_columns, fsync_every=10):
+        if os.path.exists(file_name):
+            drop_partial_row(file_name)
+        resume = os.path.exists(file_name) and os.path.getsize(file_name) > 0
+        self.file = open(file_name, 'a', newline='', buffering=64 * 1024)
+        self.writer = csv.writer(self.file)
+        self.fsync_every = fsync_every
+        self.unsynced_rows = 0
+        if not resume:
+            self.writer.writerow(columns)
+
+    def write_row(self, row):
+        # every row goes to the OS at once (survives a crash of the
+        # process), the disk sync is only every fsync_every rows
+        self.writer.writerow(row)
+        self.file.flush()
+        self.unsynced_rows += 1
+        if self.unsynced_rows >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        # push the buffered rows to the disk
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced_rows = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+
+def write_columnar(csv_file, columnar_file):
+    '''
+    Save the trials of a csv data file as a columnar file,
+    Parquet if the name ends with .parquet, otherwise Feather
+    return False (and print why) when pyarrow is not installed
+    '''
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        import pyarrow.parquet as parquet
+    except ImportError:
+        print("pyarrow not installed, no columnar file saved")
+        return False
+
+    with open(csv_file, newline='') as data_file:
+        reader = csv.DictReader(data_file)
+        rows = list(reader)
+    session = {column: rows[0][column] if rows else ''
+               for column in session_columns}
+
+    columns = {}
+    for column, column_type in columnar_types.items():
+        if column not in reader.fieldnames:
+            # older files without the orientation columns
+            continue
+        # empty cells (e.g. no response before maxWait) are nulls
+        values = [row[column] or None for row in rows]
+        if column_type == 'dictionary':
+            columns[column] = pa.array(values, pa.string()).dictionary_encode()
+        elif column_type == 'float64':
+            columns[column] = pa.array([None if value is None else
+                                        float(value) for value in values],
+                                       pa.float64())
+        else:
+            columns[column] = pa.array([None if value is None else
+                                        int(value) for value in values],
+                                       getattr(pa, column_type)())
+    table = pa.table(columns)
+    table = table.replace_schema_metadata(
+        {'ep_session': json.dumps(session)})
+
+    if columnar_file.endswith('.parquet'):
+        parquet.write_table(table, columnar_file)
+    else:
+        feather.write_feather(table, columnar_file)
+    return True
+
+
+def read_columnar(columnar_file, add_session_columns=False):
+    '''
+    Load a columnar data file as a pandas DataFrame,
+    the session info is in DataFrame.attrs['session'],
+    or also repeated as columns with add_session_columns
+    '''
+    import pyarrow.feather as feather
+    import pyarrow.parquet as parquet
+
+    if columnar_file.endswith('.parquet'):
+        table = parquet.read_table(columnar_file)
+    else:
+        table = feather.read_table(columnar_file)
+    session = json.loads(table.schema.metadata[b'ep_session'])
+    data = table.to_pandas()
+    if add_session_columns:
+        for position, column in enumerate(session_columns):
+            data.insert(position, column, session[column])
+    data.attrs['session'] = session
+    return data
@@ -0,0 +1,42 @@
+'''
+Correctness scoring of the single-ensemble task
+#
+The rule used by the practice feedback, for whole arrays of trials:
+condition 1 & 4 (single post-cue) = judge the cued orientation
+condition 2 & 3 (ensemble post-cue) = judge the set orientation
+'j' (clockwise) is correct for a judged orientation > 0,
+'f' (anticlockwise) for < 0, any response is correct for 0
+#
+Works on scalars, lists, NumPy arrays or DataFrame columns, e.g. for a
+data file: score(data.Condition, data.Set_Orientation,
+data.Cued_Orientation, data.Response)
+'''
+
+import numpy as np
+
+
+def target_orientation(condition, set_orientation, cued_orientation):
+    # the orientation the observer has to judge on every trial
+    condition = np.asarray(condition)
+    return np.where((condition == 1) | (condition == 4),
+                    np.asarray(cued_orientation),
+                    np.asarray(set_orientation))
+
+
+def score(condition, set_orientation, cued_orientation, response):
+    '''
+    Return True where the response is correct, False where it is wrong
+    response = 'f' (anticlockwise) or 'j' (clockwise)
+    '''
+    target = target_orientation(condition, set_orientation,
+                                cued_orientation)
+    clockwise = np.asarray(response) != 'f'
+    return (target == 0) | (clockwise == (target > 0))
+
+
+def accuracy_by_condition(condition, correct):
+    # proportion correct per condition, {condition: proportion}
+    condition = np.asarray(condition)
+    correct = np.asarray(correct)
+    return {int(cond): float(correct[condition == cond].mean())
+            for cond in np.unique(condition)}
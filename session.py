@@ -0,0 +1,124 @@
+'''
+Session of the experiment or the practice script
+#
+Nothing is opened when the scripts are imported: the profile (config.py),
+the window, the stimuli, the frame scheduler and the keyboard belong to a
+Session created by the script's main(). psychopy itself is only imported
+when the window is opened (see backends.py), so the trial design
+(trial_design.py) and the stimulus geometry (stimuli.pos_to_coordinate)
+can be imported for analyses & tests without the display stack.
+#
+Opening the window calibrates it (presentation.calibrate): the measured
+refresh rate drives the frame scheduler, and the session stops when too
+many 9-Gabor flips take longer than 1 frame.
+'''
+
+import sys
+
+import numpy as np
+
+from backends import monitors, visual
+from config import load_config
+from engine import gaborset
+from presentation import FrameScheduler, calibrate
+from responses import ResponseCollector
+from staircase import adaptive_levels
+from stimuli import create_stimuli, monitor_geometry
+from trial_design import gabor_orientations, reachable_orientations
+
+# 9-Gabor set drawn while the frame interval is measured
+calibration_layout = np.column_stack([np.arange(1, 10),
+                                      gabor_orientations(30, 30)])
+
+
+class Session:
+    '''
+    Window & trial stimuli of one run of a script
+    config = validated profile, from the command line (load_config) if None
+    '''
+
+    def __init__(self, config=None):
+        self.config = load_config() if config is None else config
+        self.win = None
+        self.stim = None
+        self.scheduler = None
+        self.responses = None
+        self.calibration = None
+
+    def open_window(self, cue_fill_color='#C0C0C0', telemetry=None):
+        '''
+        Calibrate the monitor and create the window, then build the trial
+        stimuli, measure the frame interval, and create the frame scheduler
+        (telemetry = optional TelemetryBuffer) and the background keyboard
+        return the window
+        '''
+        config = self.config
+        mon = monitors.Monitor(config['monitor_name'])
+        mon.setWidth(config['screen_width'])
+        mon.setDistance(config['view_distance'])
+        self.win = visual.Window(size=config['screen_resolution'],
+                                 color='#C0C0C0', fullscr=True, monitor=mon,
+                                 allowGUI = True
+                                 )
+        # build the trial stimuli once, the trial functions reuse them
+        # and present every screen for a fixed number of frames
+        self.stim = create_stimuli(self.win, config['line_width_in_pixel'],
+                                   monitor_geometry(config),
+                                   cue_fill_color=cue_fill_color,
+                                   gabor_rendering=config['gabor_rendering'],
+                                   orientations=self.gabor_orientations())
+        self.calibration = calibrate(self.win, self.draw_gabor_set,
+                                     config['calibration_flips'])
+        self.check_calibration()
+        self.scheduler = FrameScheduler(
+            self.win, refresh_rate=self.calibration['refresh_rate'],
+            telemetry=telemetry)
+        # key presses are timestamped by the background keyboard
+        self.responses = ResponseCollector(self.scheduler)
+        return self.win
+
+    def gabor_orientations(self):
+        # every orientation the 9-Gabor sets of the profile can show
+        config = self.config
+        set_orientations = list(config['set_orientations'])
+        cued_orientations = list(config['cued_orientations'])
+        if config['adaptive_trials']:
+            levels = adaptive_levels.tolist() + [0]
+            set_orientations += levels
+            cued_orientations += levels
+        return reachable_orientations(set_orientations, cued_orientations)
+
+    def draw_gabor_set(self):
+        # the heaviest screen of a trial
+        gaborset(self.stim, calibration_layout)
+
+    def check_calibration(self):
+        '''
+        Print the measured frame interval, warn about late 9-Gabor flips or
+        a rate other than the profile's refresh_rate, and stop the session
+        when more than max_late_fraction of the flips were late
+        '''
+        config = self.config
+        calibration = self.calibration
+        print("Refresh rate: {:.2f} Hz ({:.3f} ms, jitter {:.3f} ms, "
+              "max {:.3f} ms)".format(calibration['refresh_rate'],
+                                      calibration['frame_ms'],
+                                      calibration['jitter_ms'],
+                                      calibration['max_ms']))
+        expected = config['refresh_rate']
+        if expected is not None and \
+                abs(calibration['refresh_rate'] - expected) > 0.01 * expected:
+            print("WARNING: the profile expects {:.2f} Hz".format(expected))
+        late = calibration['screen_late']
+        if late:
+            print("WARNING: {} of {} 9-Gabor flips took over 1 frame "
+                  "(max {:.3f} ms)".format(late, calibration['flips'],
+                                           calibration['screen_max_ms']))
+        if late > config['max_late_fraction'] * calibration['flips']:
+            self.close()
+            sys.exit("The 9-Gabor screen cannot be drawn within 1 frame "
+                     "on this display, session stopped")
+
+    def close(self):
+        if self.win is not None:
+            self.win.close()
@@ -0,0 +1,157 @@
+'''
+Synthetic observers for the single-ensemble task
+#
+Simulates whole sessions of 'f' (anticlockwise) / 'j' (clockwise)
+responses without a display, on the same trial design (trial_design.py)
+and the same 9-gabor orientations as gaborset(). All sessions are drawn
+at once as (sessions x trials) arrays, e.g. 10000 sessions of 392 trials
+in a few seconds, to check the design & the statistical power before
+testing in the lab:
+python simulate.py --sessions 10000 --rule postcue --seed 1
+#
+Decision rules (what the observer judges on every trial):
+single = always the cued gabor
+ensemble = always the average of the 9 gabors
+postcue = what the post-cue asks for, the cued gabor in condition 1 & 4,
+the average of the set in condition 2 & 3
+#
+Every gabor is seen with item_noise (deg), the average of the 9 noisy
+gabors therefore with item_noise / 3, then decision_noise is added.
+When the judged representation does not match the pre-cue (e.g. the set
+average after a single pre-cue) the noise is multiplied by
+incongruent_cost. On a lapse the response is a random key.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from scoring import score, target_orientation
+from trial_design import build_triallist, gabor_orientations
+
+rules = ('single', 'ensemble', 'postcue')
+
+
+def judged_single(condition, rule):
+    # True where the observer judges the cued gabor, False for the average
+    condition = np.asarray(condition)
+    if rule == 'single':
+        return np.ones(condition.shape, dtype=bool)
+    if rule == 'ensemble':
+        return np.zeros(condition.shape, dtype=bool)
+    if rule == 'postcue':
+        return (condition == 1) | (condition == 4)
+    raise ValueError("Unknown decision rule: {} ({})"
+                     .format(rule, ', '.join(rules)))
+
+
+def observer_evidence(triallist, rule='postcue', item_noise=8.0,
+                      decision_noise=2.0, incongruent_cost=1.5):
+    '''
+    Mean & sd (deg) of the observer's orientation estimate on every trial,
+    a clockwise ('j') response when the estimate is > 0
+    '''
+    condition = triallist['condition']
+    orientations = gabor_orientations(triallist['set_orientation'],
+                                      triallist['cued_orientation'])
+    single = judged_single(condition, rule)
+    mean = np.where(single, orientations[:, 0], orientations.mean(axis=1))
+    sd = np.where(single, item_noise, item_noise / 3.0)
+    sd = np.sqrt(sd ** 2 + decision_noise ** 2)
+    # single pre-cue in condition 1 & 2, ensemble pre-cue in 3 & 4
+    precue_single = (condition == 1) | (condition == 2)
+    return mean, np.where(single == precue_single, sd,
+                          sd * incongruent_cost)
+
+
+def simulate_sessions(triallist, n_sessions, rule='postcue', item_noise=8.0,
+                      decision_noise=2.0, incongruent_cost=1.5, lapse=0.02,
+                      rng=None):
+    '''
+    Simulate n_sessions observers on the trial list (structured array of
+    trial_design.trial_dtype), return the responses as a
+    (n_sessions, n_trials) array of 'f' / 'j'
+    '''
+    rng = np.random.default_rng(rng)
+    mean, sd = observer_evidence(triallist, rule, item_noise,
+                                 decision_noise, incongruent_cost)
+    shape = (n_sessions, len(triallist))
+    clockwise = mean + sd * rng.standard_normal(shape) > 0
+    lapses = rng.random(shape) < lapse
+    clockwise[lapses] = rng.random(int(lapses.sum())) < 0.5
+    return np.where(clockwise, 'j', 'f')
+
+
+def clockwise_table(triallist, responses):
+    '''
+    Proportion of 'j' responses over all sessions per condition and
+    judged orientation (cued ori in condition 1 & 4, set ori in 2 & 3),
+    return {condition: {orientation: proportion}}
+    '''
+    condition = triallist['condition']
+    target = target_orientation(condition, triallist['set_orientation'],
+                                triallist['cued_orientation'])
+    clockwise = (responses == 'j').mean(axis=0)
+    table = {}
+    for cond in np.unique(condition):
+        table[int(cond)] = {}
+        for ori in np.unique(target):
+            trials = (condition == cond) & (target == ori)
+            table[int(cond)][int(ori)] = float(clockwise[trials].mean())
+    return table
+
+
+def session_accuracy(triallist, responses):
+    '''
+    Proportion correct of every session per condition (scoring.py),
+    return {condition: array of n_sessions proportions}
+    '''
+    condition = triallist['condition']
+    correct = score(condition, triallist['set_orientation'],
+                    triallist['cued_orientation'], responses)
+    return {int(cond): correct[:, condition == cond].mean(axis=1)
+            for cond in np.unique(condition)}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulate observers of the single-ensemble task")
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--rule', choices=rules, default='postcue')
+    parser.add_argument('--item-noise', type=float, default=8.0)
+    parser.add_argument('--decision-noise', type=float, default=2.0)
+    parser.add_argument('--incongruent-cost', type=float, default=1.5)
+    parser.add_argument('--lapse', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', default=None,
+                        help="npz file for the trial list and the responses")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    triallist = build_triallist([1,2,3,4], [0,10,-10,20,-20,30,-30],
+                                [0,10,-10,20,-20,30,-30], 2,
+                                seed=rng.integers(2 ** 32))
+    start = time.perf_counter()
+    responses = simulate_sessions(triallist, args.sessions, args.rule,
+                                  args.item_noise, args.decision_noise,
+                                  args.incongruent_cost, args.lapse, rng)
+    elapsed = time.perf_counter() - start
+    print("{} sessions of {} trials in {:.3f} s ({:.0f} sessions/s)".format(
+        args.sessions, len(triallist), elapsed, args.sessions / elapsed))
+
+    table = clockwise_table(triallist, responses)
+    orientations = sorted(table[1])
+    print("p('j')" + ''.join("{:>8}".format(ori) for ori in orientations))
+    for cond, row in table.items():
+        print("cond {}".format(cond) +
+              ''.join("{:>8.3f}".format(row[ori]) for ori in orientations))
+    for cond, accuracy in session_accuracy(triallist, responses).items():
+        print("cond {} accuracy: mean {:.3f}, sd over sessions {:.3f}"
+              .format(cond, accuracy.mean(), accuracy.std()))
+    if args.out:
+        np.savez(args.out, triallist=triallist, responses=responses)
+
+
+if __name__ == '__main__':
+    main()
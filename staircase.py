@@ -0,0 +1,173 @@
+'''
+Adaptive (Psi method) choice of the judged orientation
+#
+An alternative to the static 392-trial design: every condition has its
+own staircase with a posterior over the pse & width of a cumulative
+Gaussian (see analysis.py). Before each trial the judged orientation
+(the cued orientation in condition 1 & 4, the set orientation in 2 & 3)
+is the level with the lowest expected posterior entropy after the
+response (Kontsevich & Tyler, 1999), so far fewer trials are spent at
+the ceiling levels (+-30 deg).
+#
+The likelihood of every level is computed once, so an update is a
+multiplication of the posterior with one row of it. The expected entropy
+of all levels is written as 4 matrix-vector products with precomputed
+tables, together well under 1 ms.
+#
+The condition order, the positions and the orientation that is not
+judged are fixed before the session (build_adaptive_triallist), only the
+judged orientation is filled in while the trials run.
+'''
+
+import csv
+
+import numpy as np
+
+from analysis import psychometric
+from trial_design import trial_dtype
+
+adaptive_levels = np.arange(-30, 31, 2)  # judged orientations to choose from
+pse_grid = np.arange(-20, 21, 1.0)
+width_grid = np.exp(np.linspace(np.log(1), np.log(40), 25))
+estimate_columns = ['Condition', 'PSE', 'PSE_SD', 'Width', 'Width_SD',
+                    'Trials']
+
+
+def judged_field(condition):
+    # field of the trial list holding the judged orientation
+    if condition == 1 or condition == 4:
+        return 'cued_orientation'
+    return 'set_orientation'
+
+
+class PsiStaircase:
+    '''
+    Posterior over (pse, width) for one condition
+    levels = orientations the next trial is chosen from
+    lapse = lapse rate of the observer model
+    '''
+
+    def __init__(self, levels=adaptive_levels, pse=pse_grid,
+                 width=width_grid, lapse=0.02):
+        self.levels = np.asarray(levels)
+        pse, width = np.meshgrid(pse, width, indexing='ij')
+        self.pse = pse.ravel()
+        self.width = width.ravel()
+        # p('j') of every level (rows) for every parameter pair (columns)
+        self.likelihood = psychometric(self.levels[:, None], self.pse,
+                                       self.width, 'gaussian', lapse)
+        # l * log(l) of a 'j' and an 'f' response, for the entropies
+        self._j_log_j = self.likelihood * np.log(self.likelihood)
+        self._f_log_f = (1 - self.likelihood) * np.log(1 - self.likelihood)
+        self.posterior = np.full(self.pse.size, 1.0 / self.pse.size)
+        self.trials = 0
+
+    def next_level(self):
+        '''
+        Level with the lowest expected entropy after the response
+        the posterior after a response r is post * l_r / p_r, so
+        p_r * entropy = p_r log p_r - l_r @ (post log post)
+        - (l_r log l_r) @ post
+        '''
+        post = self.posterior
+        post_log_post = post * np.log(np.maximum(post, 1e-300))
+        p_clockwise = self.likelihood @ post
+        p_anticlockwise = 1 - p_clockwise
+        expected = p_clockwise * np.log(p_clockwise) + \
+            p_anticlockwise * np.log(p_anticlockwise) - \
+            self.likelihood @ post_log_post - self._j_log_j @ post - \
+            (1 - self.likelihood) @ post_log_post - self._f_log_f @ post
+        return int(self.levels[np.argmin(expected)])
+
+    def update(self, level, clockwise):
+        # posterior after a 'j' (clockwise) or 'f' response at level
+        row = self.likelihood[np.searchsorted(self.levels, level)]
+        self.posterior *= row if clockwise else 1 - row
+        self.posterior /= self.posterior.sum()
+        self.trials += 1
+
+    def estimate(self):
+        # posterior mean & sd of the pse and the width
+        pse_mean = self.posterior @ self.pse
+        width_mean = self.posterior @ self.width
+        return {'pse': float(pse_mean),
+                'pse_sd': float(np.sqrt(self.posterior @
+                                        (self.pse - pse_mean) ** 2)),
+                'width': float(width_mean),
+                'width_sd': float(np.sqrt(self.posterior @
+                                          (self.width - width_mean) ** 2)),
+                'trials': self.trials}
+
+
+class AdaptiveDesign:
+    '''
+    One PsiStaircase per condition, fills in the judged orientation of the
+    trials of an adaptive trial list
+    '''
+
+    def __init__(self, conditions, **kwargs):
+        self.staircases = {condition: PsiStaircase(**kwargs)
+                           for condition in conditions}
+
+    def next_trial(self, trial):
+        # copy of the trial (trial_dtype) with the judged orientation chosen
+        trial = trial.copy()
+        condition = int(trial['condition'])
+        trial[judged_field(condition)] = \
+            self.staircases[condition].next_level()
+        return trial
+
+    def update(self, trial, response):
+        # only 'f' / 'j' responses are used
+        if response not in ('f', 'j'):
+            return
+        condition = int(trial['condition'])
+        self.staircases[condition].update(trial[judged_field(condition)],
+                                          response == 'j')
+
+    def replay(self, file_name):
+        # update with the trials of a data file, e.g. to resume a session
+        with open(file_name, newline='') as data_file:
+            for row in csv.DictReader(data_file):
+                trial = np.array((int(row['Condition']),
+                                  int(row['Set_Orientation']),
+                                  int(row['Cued_Orientation']),
+                                  int(row['Position'])), dtype=trial_dtype)
+                self.update(trial, row['Response'])
+
+    def estimates(self):
+        return {condition: staircase.estimate()
+                for condition, staircase in self.staircases.items()}
+
+
+def build_adaptive_triallist(conditions, set_orientations, cued_orientations,
+                             n_trials, rng=None):
+    '''
+    Trial list of an adaptive session: n_trials / len(conditions) trials
+    of every condition in random order, a random position (1-9) and a
+    random orientation that is not judged (of set_orientations in
+    condition 1 & 4, of cued_orientations in 2 & 3),
+    the judged orientation is 0 until the trial is run
+    '''
+    rng = np.random.default_rng(rng)
+    triallist = np.zeros(n_trials, dtype=trial_dtype)
+    triallist['condition'] = rng.permutation(
+        np.resize(np.asarray(conditions), n_trials))
+    triallist['position'] = rng.integers(1, 10, n_trials)
+    single_post = np.isin(triallist['condition'], [1, 4])
+    triallist['set_orientation'] = np.where(
+        single_post, rng.choice(set_orientations, n_trials), 0)
+    triallist['cued_orientation'] = np.where(
+        single_post, 0, rng.choice(cued_orientations, n_trials))
+    return triallist
+
+
+def write_estimates(file_name, estimates):
+    # csv of the posterior estimates of every condition
+    with open(file_name, 'w', newline='') as estimate_file:
+        writer = csv.writer(estimate_file)
+        writer.writerow(estimate_columns)
+        for condition, estimate in sorted(estimates.items()):
+            writer.writerow([condition, estimate['pse'], estimate['pse_sd'],
+                             estimate['width'], estimate['width_sd'],
+                             estimate['trials']])
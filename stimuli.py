@@ -0,0 +1,277 @@
+'''
+Stimulus registry shared by ver2_experiment.py and practice_trials.py
+#
+Every visual object drawn inside a trial is created once, right after the
+window is opened. The trial functions (fixation, precue, gaborset, postcue)
+only update pos / ori on the cached objects before drawing them.
+The break screen texts are also built once (create_break_stimuli), so the
+digit glyphs of the countdown are rendered a single time per session.
+#
+The 9-Gabor set is drawn by rotating & drawing the 9 cached gratings (the
+default gabor_rendering = 'gratings', as the experiment was designed).
+gabor_rendering = 'elements' draws it as 1 ElementArrayStim
+(GaborElements): the orientations of a trial are written into its oris
+array in 1 NumPy step and the set is 1 draw call, and
+gabor_rendering = 'atlas' replaces the gratings by a GaborAtlas:
+every orientation the trial design can produce is rendered once at
+startup into its own pre-rotated texture, a trial only moves the patches
+to their positions (no texture or rotation updates per draw). The atlas
+still makes 9 draw calls per set: an ElementArrayStim has 1 texture for
+all its elements and the 9 patches of a set have (almost always) 9
+different orientations, so only 'elements' draws the set in 1 call.
+Whether the elements or gabor_texture match the phase, contrast & sf of
+the gratings is not verified, check it on the display with gabor_check.py
+before a rig uses either of them.
+#
+The cue & feedback circles share their vertices through a cache keyed by
+(radius, units, monitor): the number of vertices follows the circumference
+on the screen, so neighbouring vertices are less than 1 pixel apart
+(instead of a fixed 1000 edges), and every session in the process reuses
+them.
+'''
+
+import math
+
+import numpy as np
+
+from backends import visual
+
+gabor_size = 1.6  # deg
+gabor_sf = 3  # cycles per deg
+gabor_res = 128  # texture pixels
+
+_circle_cache = {}  # (radius, units, monitor) -> vertices
+
+
+def monitor_geometry(config):
+    # hashable (screen width cm, view distance cm, horizontal pixels)
+    return (config['screen_width'], config['view_distance'],
+            config['screen_resolution'][0])
+
+
+def pixels_per_unit(units, monitor):
+    # pixels per deg (as psychopy's deg2pix), per cm or per pixel
+    screen_width, view_distance, resolution = monitor
+    pixels_per_cm = resolution / screen_width
+    if units == 'deg':
+        return pixels_per_cm * view_distance * math.pi / 180
+    if units == 'cm':
+        return pixels_per_cm
+    if units == 'pix':
+        return 1.0
+    raise ValueError("Unsupported circle units: {}".format(units))
+
+
+def circle_vertices(radius, units, monitor):
+    '''
+    Vertices of a circle of radius (in units) on the monitor, the edge
+    count is the circumference in pixels rounded up, so the vertices are
+    under 1 pixel apart, computed once per (radius, units, monitor)
+    '''
+    key = (radius, units, monitor)
+    vertices = _circle_cache.get(key)
+    if vertices is None:
+        circumference = 2 * math.pi * radius * pixels_per_unit(units,
+                                                               monitor)
+        edges = max(32, int(math.ceil(circumference)) + 1)
+        angles = np.linspace(0, 2 * np.pi, edges, endpoint=False)
+        vertices = radius * np.column_stack([np.sin(angles),
+                                             np.cos(angles)])
+        _circle_cache[key] = vertices
+    return vertices
+
+
+def circle(win, radius, monitor, **kwargs):
+    # filled & outlined circle (in deg) with the cached vertices
+    return visual.ShapeStim(win=win, units='deg', closeShape=True,
+                            vertices=circle_vertices(radius, 'deg', monitor),
+                            **kwargs)
+
+
+def pos_to_coordinate(position):
+    '''
+    Dictionary to convert position code to coordinates,
+    Position Code Refer below
+    (1,2,3)
+    (4,5,6)
+    (7,8,9)
+    '''
+    return {1: (-1.4142, 1.4142),
+            2: (0, 2),
+            3: (1.4142, 1.4142),
+            4: (-2, 0),
+            5: (0,0),
+            6: (2, 0),
+            7: (-1.4142, -1.4142),
+            8: (0, -2),
+            9: (1.4142, -1.4142)}.get(position)
+
+
+def gabor_texture(orientation, size=gabor_size, sf=gabor_sf, res=gabor_res):
+    '''
+    Sine grating of sf cycles per deg over size deg, rotated clockwise by
+    orientation (deg) like a GratingStim, as a res x res array of -1..1
+    (row 0 at the bottom, as psychopy maps numpy textures), the gaussian
+    envelope is the mask of the stimulus
+    the phase (0 at the centre) is assumed to be the GratingStim's, see
+    gabor_check.py
+    '''
+    coordinates = ((np.arange(res) + 0.5) / res - 0.5) * size
+    x, y = np.meshgrid(coordinates, coordinates)
+    theta = np.deg2rad(orientation)
+    return np.sin(2 * np.pi * sf * (x * np.cos(theta) - y * np.sin(theta)))
+
+
+class GaborAtlas:
+    '''
+    Pre-rotated Gabor patches, 1 ImageStim per orientation, drawn one by
+    one (9 draw calls per set)
+    orientations = the orientations rendered at startup, any other one is
+    rendered on its first draw
+    '''
+
+    def __init__(self, win, orientations=()):
+        self.win = win
+        self.patches = {}
+        self.coordinates = {position: pos_to_coordinate(position)
+                            for position in range(1, 10)}
+        for orientation in orientations:
+            self.patch(int(orientation))
+
+    def patch(self, orientation):
+        patch = self.patches.get(orientation)
+        if patch is None:
+            patch = visual.ImageStim(win=self.win, units='deg',
+                                     image=gabor_texture(orientation),
+                                     mask='gauss',
+                                     size=(gabor_size, gabor_size),
+                                     texRes=gabor_res, interpolate=True
+                                     )
+            self.patches[orientation] = patch
+        return patch
+
+    def draw(self, layout):
+        # layout = (9, 2) array of (position, orientation)
+        for position, orientation in layout:
+            patch = self.patch(int(orientation))
+            patch.pos = self.coordinates[position]
+            patch.draw()
+
+
+class GaborElements:
+    '''
+    The 9-Gabor set as 1 ElementArrayStim, element i at position i + 1
+    '''
+
+    def __init__(self, win):
+        coordinates = [pos_to_coordinate(position)
+                       for position in range(1, 10)]
+        self.oris = np.zeros(9)
+        self.elements = visual.ElementArrayStim(
+            win=win, units='deg', nElements=9, xys=coordinates,
+            sizes=gabor_size, sfs=gabor_sf, oris=self.oris,
+            elementTex='sin', elementMask='gauss', texRes=gabor_res,
+            interpolate=True)
+        self._layout = None  # layout of the current oris
+
+    def draw(self, layout):
+        # layout = (9, 2) array of (position, orientation)
+        if layout is not self._layout:
+            # the set is drawn on every frame of the screen, the
+            # orientations only change with the trial
+            self.oris[layout[:, 0] - 1] = layout[:, 1]
+            self.elements.oris = self.oris
+            self._layout = layout
+        self.elements.draw()
+
+
+def create_stimuli(win, line_width_in_pixel, monitor,
+                   cue_fill_color='#C0C0C0', gabor_rendering='gratings',
+                   orientations=()):
+    '''
+    Build all trial stimuli for the window and return them in a dict
+    monitor = monitor_geometry() of the profile, for the circle vertices
+    fix_hori, fix_vert = the 2 bars of the fixation cross
+    single_cue = small cue circle (pre & post cue), moved to the position
+    set_cue = big cue circle around the whole set (pre & post cue)
+    gratings = one grating per position code (1-9), pos fixed to its slot
+    gabor_set = GaborElements (gabor_rendering 'elements'), GaborAtlas of
+    the orientations ('atlas') or None ('gratings', they are rotated)
+    correct_fb, wrong_fb = green & red feedback discs of the practice trials
+    '''
+    stimuli = {}
+    stimuli['fix_hori'] = visual.Rect(win = win, width=0.9, height=0.1,
+                                      units='deg', lineColor='black',
+                                      fillColor='black', pos=(0,0)
+                                      )
+    stimuli['fix_vert'] = visual.Rect(win = win, width=0.1, height=0.9,
+                                      units='deg', lineColor='black',
+                                      fillColor='black', pos=(0,0)
+                                      )
+    stimuli['single_cue'] = circle(win, 0.9, monitor,
+                                   fillColor=cue_fill_color,
+                                   lineColor='black',
+                                   lineWidth=line_width_in_pixel,
+                                   opacity=1
+                                   )
+    stimuli['set_cue'] = circle(win, 2.85, monitor, pos=(0,0),
+                                fillColor=cue_fill_color,
+                                lineColor='black',
+                                lineWidth=line_width_in_pixel,
+                                opacity=1
+                                )
+
+    stimuli['gratings'] = {}
+    for position in range(1, 10):
+        stimuli['gratings'][position] = \
+            visual.GratingStim(win = win, units= 'deg',tex='sin',
+                               mask='gauss', ori=0,
+                               pos=pos_to_coordinate(position),
+                               size=(1.6,1.6), sf=3, opacity = 1,
+                               blendmode='avg', texRes=128,
+                               interpolate=True, depth=0.0
+                               )
+    stimuli['gabor_set'] = None
+    if gabor_rendering == 'elements':
+        stimuli['gabor_set'] = GaborElements(win)
+    elif gabor_rendering == 'atlas':
+        stimuli['gabor_set'] = GaborAtlas(win, orientations)
+
+    stimuli['correct_fb'] = circle(win, 5.5, monitor, pos=(0,0),
+                                   fillColor='#ADFF2F',
+                                   lineColor='#ADFF2F',
+                                   lineWidth=line_width_in_pixel,
+                                   opacity=1
+                                   )
+    stimuli['wrong_fb'] = circle(win, 5.5, monitor, pos=(0,0),
+                                 fillColor='#FF0000',
+                                 lineColor='#FF0000',
+                                 lineWidth=line_width_in_pixel,
+                                 opacity=1
+                                 )
+    return stimuli
+
+
+def create_break_stimuli(win):
+    '''
+    Build the texts of the break screen and return them in a dict
+    break_text = the break instructions
+    break_timer = the countdown, its digit glyphs are rendered here once
+    '''
+    stimuli = {}
+    stimuli['break_text'] = visual.TextStim(win = win, text = ' ',
+                                            font = 'Times New Roman',
+                                            pos = (0,-8), color = 'black',
+                                            units = 'deg', height = 0.9,
+                                            wrapWidth=20
+                                            )
+    stimuli['break_timer'] = visual.TextStim(win = win, text = ' ',
+                                             font = 'Source Code Pro',
+                                             pos = (0,0), color = 'black',
+                                             units = 'deg', height = 4,
+                                             wrapWidth=20
+                                             )
+    # lay out every character of the countdown once to cache the glyphs
+    stimuli['break_timer'].setText('0123456789.')
+    stimuli['break_timer'].setText(' ')
+    return stimuli
@@ -0,0 +1,86 @@
+'''
+Per-trial timing telemetry of the trial screens
+#
+For every screen (fixation, precue, gaborset, blank, postcue, isi) and
+the response of a trial, the requested and the actual onset & duration
+are kept in a preallocated NumPy ring buffer, filled by the
+FrameScheduler (see presentation.py) while the trials run. Recording is a
+single array assignment, the csv is only written by flush(), e.g. in the
+breaks and at the end of the session with the trial data, or take() the
+records and write_records() them from another thread (background_io.py).
+#
+requested onset = where the screen should start on the planned schedule
+of the trial (the previous requested onset + its requested duration),
+the actual onset & duration come from the flip times
+'''
+
+import csv
+import os
+
+import numpy as np
+
+telemetry_columns = ['Trial_No', 'Phase', 'Requested_Onset', 'Actual_Onset',
+                     'Requested_Duration', 'Actual_Duration', 'Frames']
+telemetry_dtype = np.dtype([('trial', 'i4'),
+                            ('phase', 'U8'),
+                            ('requested_onset', 'f8'),
+                            ('actual_onset', 'f8'),
+                            ('requested_duration', 'f8'),
+                            ('actual_duration', 'f8'),
+                            ('frames', 'i4')])
+
+
+class TelemetryBuffer:
+    '''
+    Ring buffer of phase timing records
+    capacity = number of records kept before the oldest unflushed
+    records are overwritten (counted in lost)
+    '''
+
+    def __init__(self, capacity=4096):
+        self.records = np.zeros(capacity, dtype=telemetry_dtype)
+        self.capacity = capacity
+        self.count = 0  # records written since the start
+        self.flushed = 0  # records written to the file
+
+    def record(self, trial, phase, requested_onset, actual_onset,
+               requested_duration, actual_duration, frames=0):
+        self.records[self.count % self.capacity] = (
+            trial, phase, requested_onset, actual_onset,
+            requested_duration, actual_duration, frames)
+        self.count += 1
+
+    @property
+    def lost(self):
+        # records overwritten before they were flushed
+        return max(0, self.count - self.capacity - self.flushed)
+
+    def pending(self):
+        # unflushed records still in the buffer, oldest first
+        start = max(self.flushed, self.count - self.capacity)
+        return self.records[np.arange(start, self.count) % self.capacity]
+
+    def take(self):
+        # copy of the unflushed records, which count as flushed from now on
+        records = self.pending()
+        self.flushed = self.count
+        return records
+
+    def flush(self, file_name):
+        '''
+        Append the unflushed records to a csv file (header if new),
+        return the number of records written
+        '''
+        return write_records(file_name, self.take())
+
+
+def write_records(file_name, records):
+    # append telemetry records to a csv file, with the header if it is new
+    new_file = not os.path.exists(file_name) or \
+        os.path.getsize(file_name) == 0
+    with open(file_name, 'a', newline='') as telemetry_file:
+        writer = csv.writer(telemetry_file)
+        if new_file:
+            writer.writerow(telemetry_columns)
+        writer.writerows(records.tolist())
+    return len(records)
@@ -0,0 +1,350 @@
+'''
+Trial design of the single-ensemble task
+#
+The condition x set ori x cued ori x position design is built as one
+NumPy structured array (1 row per trial) and ordered with a single seeded
+permutation. Orders can be constrained with:
+max_run = no more than max_run trials of the same condition in a row
+balance_positions = the 9 positions are used equally often in the design
+and in each of the n_blocks blocks (between the breaks)
+position_tolerance = in each block, the counts of the 9 positions differ
+by no more than position_tolerance
+#
+generate_orders() draws candidate orders in batches of whole arrays, so
+thousands of counterbalanced orders (e.g. for a whole cohort) can be
+computed per second, also from the command line:
+python trial_design.py --orders 1000 --seed 1 --max-run 2 --balance-positions
+max_run is met by construction (limit_runs), not by drawing candidates
+until one has no long runs, which almost never happens for small max_run
+#
+build_layouts() computes the 9-patch layout (positions & orientations) of
+every trial before the session starts, so the trial loop only indexes it.
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+trial_dtype = np.dtype([('condition', 'i1'),
+                        ('set_orientation', 'i2'),
+                        ('cued_orientation', 'i2'),
+                        ('position', 'i1')])
+
+
+def balanced_positions(n_cells, n_positions, rng):
+    '''
+    n_positions different positions for every cell, with all 9 positions
+    used equally often (up to the last incomplete group of 9 cells):
+    in each group of 9 cells, the first column is a permutation of 1-9 and
+    the others are the same permutation rotated by different random offsets
+    '''
+    n_groups = -(-n_cells // 9)
+    first = np.argsort(rng.random((n_groups, 9)), axis=1)
+    offsets = np.argsort(rng.random((n_groups, 8)), axis=1) + 1
+    offsets = np.concatenate([np.zeros((n_groups, 1), dtype=int),
+                              offsets[:, :n_positions - 1]], axis=1)
+    positions = (first[:, :, None] + offsets[:, None, :]) % 9 + 1
+    positions = positions.reshape(n_groups * 9, n_positions)[:n_cells]
+    return positions[rng.permutation(n_cells)]
+
+
+def build_design(conditions, set_orientations, cued_orientations,
+                 n_positions=2, rng=None, balance_positions=False):
+    '''
+    Build the unshuffled design, one row per trial
+    n_positions different positions (out of 9) are drawn at random
+    for each condition x set ori x cued ori cell,
+    equally often for each position if balance_positions
+    '''
+    rng = np.random.default_rng(rng)
+    condition, set_ori, cued_ori = np.meshgrid(conditions, set_orientations,
+                                               cued_orientations,
+                                               indexing='ij')
+    n_cells = condition.size
+    if balance_positions:
+        positions = balanced_positions(n_cells, n_positions, rng)
+    else:
+        # first n_positions of a random permutation of 1-9 for every cell
+        positions = np.argsort(rng.random((n_cells, 9)), axis=1)
+        positions = positions[:, :n_positions] + 1
+
+    design = np.empty(n_cells * n_positions, dtype=trial_dtype)
+    design['condition'] = np.repeat(condition.ravel(), n_positions)
+    design['set_orientation'] = np.repeat(set_ori.ravel(), n_positions)
+    design['cued_orientation'] = np.repeat(cued_ori.ravel(), n_positions)
+    design['position'] = positions.ravel()
+    return design
+
+
+def longest_runs(conditions):
+    '''
+    Longest run of the same condition in every row of a
+    (n_orders, n_trials) array
+    '''
+    conditions = np.atleast_2d(conditions)
+    n_trials = conditions.shape[1]
+    if n_trials < 2:
+        return np.ones(len(conditions), dtype=int)
+    index = np.arange(1, n_trials)
+    # trial index where the current run started, carried forward
+    run_start = np.where(conditions[:, 1:] != conditions[:, :-1], index, 0)
+    run_start = np.maximum.accumulate(run_start, axis=1)
+    return np.maximum((index - run_start + 1).max(axis=1), 1)
+
+
+def position_spread(positions, n_blocks):
+    '''
+    Largest difference between the counts of the 9 positions within a
+    block, for every row of a (n_orders, n_trials) array,
+    trials left over after n_blocks equal blocks are ignored
+    '''
+    positions = np.atleast_2d(positions)
+    block_len = positions.shape[1] // n_blocks
+    blocks = positions[:, :block_len * n_blocks].reshape(
+        len(positions), n_blocks, block_len)
+    counts = (blocks[..., None] == np.arange(1, 10)).sum(axis=2)
+    return (counts.max(axis=2) - counts.min(axis=2)).max(axis=1)
+
+
+def valid_orders(design, orders, max_run=None, n_blocks=4,
+                 position_tolerance=None):
+    # boolean mask of the orders (rows of trial indices) meeting constraints
+    valid = np.ones(len(orders), dtype=bool)
+    if max_run is not None:
+        valid &= longest_runs(design['condition'][orders]) <= max_run
+    if position_tolerance is not None:
+        valid &= position_spread(design['position'][orders],
+                                 n_blocks) <= position_tolerance
+    return valid
+
+
+def random_orders(design, n_orders, rng, n_blocks=4,
+                  balance_positions=False, with_blocks=False):
+    '''
+    n_orders random permutations of the design rows, as a
+    (n_orders, n_trials) array of row indices
+    if balance_positions, the trials of each position are dealt in turn
+    to the n_blocks blocks before the trials are shuffled within blocks
+    with_blocks = also return the block of every trial of the orders
+    (all 0 without balance_positions)
+    '''
+    n_trials = len(design)
+    if not balance_positions:
+        orders = np.argsort(rng.random((n_orders, n_trials)), axis=1)
+        if with_blocks:
+            return orders, np.zeros((n_orders, n_trials), dtype=int)
+        return orders
+    # trials sorted by position (random order within a position)
+    by_position = np.argsort(design['position'] + rng.random(
+        (n_orders, n_trials)), axis=1)
+    deal = (np.arange(n_trials) + rng.integers(n_blocks, size=(n_orders, 1))
+            ) % n_blocks
+    block = np.empty((n_orders, n_trials))
+    np.put_along_axis(block, by_position, deal, axis=1)
+    orders = np.argsort(block + rng.random((n_orders, n_trials)), axis=1)
+    if with_blocks:
+        return orders, np.sort(deal, axis=1)
+    return orders
+
+
+def limit_runs(design, orders, blocks, max_run, rng):
+    '''
+    Reorder the trials within every block of the orders so that no more
+    than max_run trials of the same condition follow each other
+    #
+    The condition sequence is drawn trial by trial, each condition with a
+    probability proportional to its trials left in the block, out of the
+    conditions that still leave a valid sequence: with n trials left,
+    a condition with c of them needs c <= max_run * (n - c + 1), less the
+    current run for the condition of the last trial. The trials of each
+    condition then take its places in their shuffled order, so the blocks
+    keep their trials. Orders that cannot be completed across a block
+    boundary keep a long run & are rejected by valid_orders()
+    '''
+    n_orders, n_trials = orders.shape
+    values, codes = np.unique(design['condition'], return_inverse=True)
+    n_conditions = len(values)
+    codes = codes.reshape(-1)[orders]
+    rows = np.arange(n_orders)
+    counts = np.zeros((n_orders, blocks.max() + 1, n_conditions), dtype=int)
+    np.add.at(counts, (rows[:, None], blocks, codes), 1)
+    new_block = np.ones((n_orders, n_trials), dtype=bool)
+    new_block[:, 1:] = blocks[:, 1:] != blocks[:, :-1]
+
+    same = np.eye(n_conditions, dtype=bool)
+    left = np.zeros((n_orders, n_conditions), dtype=int)
+    last = np.full(n_orders, -1)
+    run = np.zeros(n_orders, dtype=int)
+    sequence = np.empty((n_orders, n_trials), dtype=int)
+    for t in range(n_trials):
+        starting = new_block[:, t]
+        left[starting] = counts[starting, blocks[starting, t]]
+        # runs & trials left after each candidate condition (axis 1)
+        next_run = np.where(np.arange(n_conditions) == last[:, None],
+                            run[:, None] + 1, 1)
+        after = left[:, None, :] - same
+        n_after = left.sum(axis=1)[:, None, None] - 1
+        room = max_run * (n_after - after + 1) - same * next_run[:, :, None]
+        allowed = ((left > 0) & (next_run <= max_run)
+                   & (after <= room).all(axis=2))
+        # dead end (rare, after a block boundary): any condition left
+        stuck = ~allowed.any(axis=1)
+        allowed[stuck] = left[stuck] > 0
+        weights = np.cumsum(left * allowed, axis=1)
+        draw = rng.random(n_orders) * weights[:, -1]
+        choice = (weights <= draw[:, None]).sum(axis=1)
+        sequence[:, t] = choice
+        left[rows, choice] -= 1
+        run = np.where(choice == last, run + 1, 1)
+        last = choice
+
+    # k-th trial of a condition in a block -> k-th place of it in the block
+    trials = np.argsort(blocks * n_conditions + codes, axis=1, kind='stable')
+    places = np.argsort(blocks * n_conditions + sequence, axis=1,
+                        kind='stable')
+    limited = np.empty_like(orders)
+    limited[rows[:, None], places] = np.take_along_axis(orders, trials,
+                                                        axis=1)
+    return limited
+
+
+def generate_orders(design, n_orders, rng=None, max_run=None, n_blocks=4,
+                    balance_positions=False, position_tolerance=None,
+                    batch_size=1000, max_batches=1000):
+    '''
+    Draw n_orders random orders of the design meeting the constraints,
+    return a (n_orders, n_trials) array of row indices into the design
+    candidates are drawn (with max_run met by limit_runs) & checked
+    batch_size at a time, RuntimeError if max_batches batches do not give
+    enough valid orders
+    '''
+    rng = np.random.default_rng(rng)
+    found = []
+    n_found = 0
+    for batch in range(max_batches):
+        orders, blocks = random_orders(design, batch_size, rng, n_blocks,
+                                       balance_positions, with_blocks=True)
+        if max_run is not None:
+            orders = limit_runs(design, orders, blocks, max_run, rng)
+        orders = orders[valid_orders(design, orders, max_run, n_blocks,
+                                     position_tolerance)]
+        found.append(orders)
+        n_found += len(orders)
+        if n_found >= n_orders:
+            return np.concatenate(found)[:n_orders]
+    raise RuntimeError("Only {} of {} orders meet the constraints after {} "
+                       "candidates".format(n_found, n_orders,
+                                           max_batches * batch_size))
+
+
+def build_triallist(conditions, set_orientations, cued_orientations,
+                    n_positions=2, seed=None, max_run=None, n_blocks=4,
+                    balance_positions=False, position_tolerance=None):
+    '''
+    Build the design and shuffle it with a single seeded permutation,
+    return the trial list as a structured array (fields in the order
+    condition, set_orientation, cued_orientation, position)
+    '''
+    rng = np.random.default_rng(seed)
+    design = build_design(conditions, set_orientations, cued_orientations,
+                          n_positions, rng, balance_positions)
+    order = generate_orders(design, 1, rng, max_run, n_blocks,
+                            balance_positions, position_tolerance,
+                            batch_size=100)[0]
+    return design[order]
+
+
+def gabor_orientations(set_orientation, cued_orientation):
+    '''
+    Orientations of the 9-gabor set for arrays of set & cued orientations,
+    return an array with a last axis of 9: the cued orientation first,
+    followed by the 8 flankers
+    #
+    0 and -cued (15 and -15 when cued is 0, to prevent 3 0s),
+    5, 10, 15 and -5, -10, -15, where the side of the set tilt is
+    shifted by 2x and the other side by 1x the set orientation
+    '''
+    set_orientation = np.asarray(set_orientation, dtype=int)
+    cued_orientation = np.asarray(cued_orientation, dtype=int)
+    pos_shift = np.where(set_orientation > 0, 2 * set_orientation,
+                         set_orientation)
+    neg_shift = np.where(set_orientation > 0, set_orientation,
+                         2 * set_orientation)
+
+    orientations = np.empty(set_orientation.shape + (9,), dtype=int)
+    orientations[..., 0] = cued_orientation
+    orientations[..., 1] = np.where(cued_orientation == 0, 15, 0)
+    orientations[..., 2] = np.where(cued_orientation == 0, -15,
+                                    -cued_orientation)
+    orientations[..., 3:6] = np.array([5,10,15]) + pos_shift[..., None]
+    orientations[..., 6:9] = -np.array([5,10,15]) + neg_shift[..., None]
+    return orientations
+
+
+def reachable_orientations(set_orientations, cued_orientations):
+    # every orientation of the 9-gabor sets of the design, sorted
+    set_orientation, cued_orientation = np.meshgrid(set_orientations,
+                                                    cued_orientations)
+    return np.unique(gabor_orientations(set_orientation, cued_orientation))
+
+
+def build_layouts(triallist, rng=None):
+    '''
+    9-patch layout of every trial, as a (n_trials, 9, 2) array of
+    (position, orientation) pairs: the cued patch first at the cued
+    position, then the 8 flankers in random orientation order
+    at the other 8 positions in random order
+    '''
+    rng = np.random.default_rng(rng)
+    n_trials = len(triallist)
+    # cued position forced first, the other positions randomly after it
+    keys = rng.random((n_trials, 9))
+    keys[np.arange(n_trials), triallist['position'] - 1] = -1
+    positions = np.argsort(keys, axis=1) + 1
+
+    orientations = gabor_orientations(triallist['set_orientation'],
+                                      triallist['cued_orientation'])
+    flankers = np.argsort(rng.random((n_trials, 8)), axis=1) + 1
+    orientations[:, 1:] = np.take_along_axis(orientations, flankers, axis=1)
+    return np.stack([positions, orientations], axis=2).astype('i2')
+
+
+def orientations_by_position(layouts):
+    # (n_trials, 9) orientations of position 1-9 from the layouts
+    by_position = np.empty(layouts.shape[:2], dtype=layouts.dtype)
+    np.put_along_axis(by_position, layouts[:, :, 0] - 1, layouts[:, :, 1],
+                      axis=1)
+    return by_position
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pre-compute counterbalanced trial orders")
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-run', type=int, default=None)
+    parser.add_argument('--blocks', type=int, default=4)
+    parser.add_argument('--balance-positions', action='store_true')
+    parser.add_argument('--position-tolerance', type=int, default=None)
+    parser.add_argument('--out', default=None,
+                        help="npz file for the design and the orders")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    design = build_design([1,2,3,4], [0,10,-10,20,-20,30,-30],
+                          [0,10,-10,20,-20,30,-30], 2, rng,
+                          args.balance_positions)
+    start = time.perf_counter()
+    orders = generate_orders(design, args.orders, rng, args.max_run,
+                             args.blocks, args.balance_positions,
+                             args.position_tolerance)
+    elapsed = time.perf_counter() - start
+    print("{} orders of {} trials in {:.3f} s ({:.0f} orders/s)".format(
+        len(orders), len(design), elapsed, len(orders) / elapsed))
+    if args.out:
+        np.savez(args.out, design=design, orders=orders)
+
+
+if __name__ == '__main__':
+    main()
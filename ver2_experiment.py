@@ -19,17 +19,31 @@ Trial Constructions:
 }
 == 392 trials
 #
-Break Trials:
+Break Trials (after a quarter, half & 3 quarters of the trials):
 1 min Self-Terminated Break (in trial 98 & trial 294)
 2 min Mandatory Break (in trial 196)
+the durations & trial counts follow the profile (short_break_time,
+long_break_time, No_of_Trials), so do the instructions
 '''
 
 # import libraries
+import atexit
+from background_io import IOWorker
 from datetime import datetime
+from engine import TrialEngine
+import math
 import numpy as np
 import os
-import pandas as pd
-from psychopy import visual, event, monitors, core, logging, gui
+from backends import visual, event, core, logging, gui
+from presentation import write_calibration, write_flip_log
+from session import Session
+from staircase import AdaptiveDesign, build_adaptive_triallist, \
+    write_estimates
+from results import TrialWriter, completed_trials, write_columnar
+from telemetry import TelemetryBuffer, write_records
+from stimuli import create_break_stimuli
+from trial_design import build_layouts, build_triallist, \
+    orientations_by_position
 import sys
 
 '''
@@ -37,123 +51,145 @@ variables to calibrate the monitor
 line_width_in_pixel is only used in the line width of the
 precue and postcue, psychopy not supported in deg units
 The border width of the circle is 0.2 visual angle
+#
+The monitor, timing & design values come from a profile (config.py),
+e.g. python ver2_experiment.py --profile home
+Nothing is opened on import, main() creates the session (see session.py)
 '''
+session = None  # the running ExperimentSession, created by main()
+
+
+class ExperimentSession(Session):
+    '''
+    Trial list, observer's info & data files of an experiment session,
+    on top of the window & stimuli of a Session
+    '''
 
-# Setting for the 2 Monitors in RLG307
-monitor_name = 'RLG307'
-view_distance = 60
-screen_width = 59.8
-screen_resolution = [3840,2160]
-line_width_in_pixel = 13
-
-# Setting for Home Monitor
-# monitor_name = 'testMonitor'
-# view_distance = 60
-# screen_width = 47.5
-# screen_resolution = [1680,1050]
-# line_width_in_pixel = 7
-
-# declare timing variables
-fixation_time = 0.25
-precue_time = 0.75
-gaborset_time = 0.2
-blankscreen_time = 0.4
-isi_time = 0.5
-short_break_time = 60
-long_break_time = 120
-
-# declare variables for trial generations
-No_of_Trials = 392
-conditions = [1,2,3,4]
-set_orientations = [0,10,-10,20,-20,30,-30]
-cued_orientations = [0,10,-10,20,-20,30,-30]
-positions = [1,2,3,4,5,6,7,8,9]
-breaktrial = [  # for break trials
-    ((No_of_Trials / 4) - 1),
-    ((No_of_Trials / 2) - 1),
-    ((3 * No_of_Trials / 4) - 1)]
-
-# generate the trial list and randomly shuffle
-triallist = []
-for condition in conditions:
-    for set_orientation in set_orientations:
-        for cued_orientation in cued_orientations:
-            np.random.shuffle(positions)
-            for position in positions[0:2]:
-                trial = [condition, set_orientation, cued_orientation, position]
-                triallist.append(trial)
-                np.random.shuffle(triallist)
-
-# generate blank arrays for the output data file
-date_array = []
-time_array = []
-name_array = []
-age_array = []
-gender_array = []
-hand_array = []
-trial_no_array = []
-condition_array = []
-set_orientation_array = []
-cued_orientation_array = []
-position_array = []
-response_array = []
-latency_array = []
-
-# clear command output and start logging
-os.system('cls' if os.name == 'ht' else 'clear')
-logging.console.setLevel(logging.CRITICAL)
-print("**************************************")
-print("MODIFIED SPERLING'S SINGLE-ENSEMBLE TASK")
-print("PSYCHOPY LOGGING set to : CRITICAL")
-print(datetime.now())
-print("**************************************")
-
-# get current date and time
-current_date = datetime.now().strftime("%Y%m%d")
-current_time = datetime.now().strftime("%H%M%S")
-
-# get observer's information
-info = gui.Dlg(title="Ensemble Perception Experiment", pos = [600,300],
-               labelButtonOK="READY", labelButtonCancel=" ")
-info.addText("Observer's Info. ")
-info.addField('Experiment Date (YMD): ', current_date)
-info.addField('Experiment Time (HMS): ', current_time)
-info.addField('Name: ')
-info.addField('Age: ')
-info.addField('Gender:', choices = ['Male', 'Female'])
-info.addField('Dominant Hand: ', choices=['Right', 'Left'])
-show_info = info.show()
-
-# Create a data director, check info. and create save file name
-try:
-    os.mkdir('data')
-    print("Directory Created!")
-except FileExistsError:
-    print("Directory Exist!")
-
-if info.OK:
-    save_file_name = 'data/' + show_info[0] + show_info[1] + '_' + \
-        show_info[2] + '_ep_experiment.csv'
-    save_file_name_backup = 'data/' + show_info[0] + show_info[1] + '_' + \
-        show_info[2] + '_backup_orientation.csv'
-else:
-    print("User Cancelled")
-
-# Create Save Path
-save_path = gui.fileSaveDlg(initFileName=save_file_name,
-                            prompt='Select Save File'
-                            )
-# Create a Backup file for all orientation in the set
-# Refer to the gaborset function
-backup_file = open(save_file_name_backup, 'w')
-
-# calibrating monitor and creating window for experiment
-mon = monitors.Monitor(monitor_name)
-mon.setWidth(screen_width)
-mon.setDistance(view_distance)
-win = visual.Window(size=screen_resolution, color='#C0C0C0',
-                    fullscr=True, monitor=mon, allowGUI = True
-                    )
+    def __init__(self, config=None):
+        Session.__init__(self, config)
+        config = self.config
+        # declare variables for trial generations
+        self.No_of_Trials = config['adaptive_trials'] or \
+            config['No_of_Trials']
+        self.breaktrial = [  # for break trials (trial indices)
+            (self.No_of_Trials // 4) - 1,
+            (self.No_of_Trials // 2) - 1,
+            (3 * self.No_of_Trials // 4) - 1]
+        if config['adaptive_trials']:
+            # the judged orientation of every trial is chosen from the
+            # posterior of its condition while the session runs (Psi mode,
+            # see staircase.py)
+            self.triallist = build_adaptive_triallist(
+                config['conditions'], config['set_orientations'],
+                config['cued_orientations'], self.No_of_Trials)
+            self.adaptive = AdaptiveDesign(config['conditions'])
+        else:
+            # generate the trial list with a single random permutation
+            # (see trial_design.py for the constraints on the order)
+            self.triallist = build_triallist(
+                config['conditions'], config['set_orientations'],
+                config['cued_orientations'], n_positions=2,
+                max_run=config['max_condition_run'],
+                balance_positions=config['balance_positions'])
+            self.adaptive = None
+        # 9-patch positions & orientations of every trial, computed before
+        # the session so the trial loop only indexes them (see build_layouts)
+        self.layouts = build_layouts(self.triallist)
+        self.show_info = None
+        self.files = {}
+        self.save_path = None
+        self.first_trial = 0
+        self.set_orientations_by_position = None
+        self.break_stim = None
+
+    def ask_observer(self):
+        '''
+        Get the observer's info, create the data file names and
+        start a new session or resume a crashed one
+        '''
+        # get current date and time
+        current_date = datetime.now().strftime("%Y%m%d")
+        current_time = datetime.now().strftime("%H%M%S")
+
+        # get observer's information
+        info = gui.Dlg(title="Ensemble Perception Experiment",
+                       pos = [600,300], labelButtonOK="READY",
+                       labelButtonCancel=" ")
+        info.addText("Observer's Info. ")
+        info.addField('Experiment Date (YMD): ', current_date)
+        info.addField('Experiment Time (HMS): ', current_time)
+        info.addField('Name: ')
+        info.addField('Age: ')
+        info.addField('Gender:', choices = ['Male', 'Female'])
+        info.addField('Dominant Hand: ', choices=['Right', 'Left'])
+        info.addField('Resume Session: ', choices=['No', 'Yes'])
+        show_info = info.show()
+        self.show_info = show_info
+
+        # Create a data director, check info. and create save file name
+        try:
+            os.mkdir('data')
+            print("Directory Created!")
+        except FileExistsError:
+            print("Directory Exist!")
+
+        if info.OK:
+            prefix = 'data/' + show_info[0] + show_info[1] + '_' + \
+                show_info[2]
+            self.files = {'data': prefix + '_ep_experiment.csv',
+                          'flips': prefix + '_flip_times.csv',
+                          'design': prefix + '_design.npz',
+                          'columnar': prefix + '_ep_experiment.feather',
+                          'telemetry': prefix + '_telemetry.csv',
+                          'staircase': prefix + '_staircase.csv',
+                          'calibration': prefix + '_calibration.csv'}
+        else:
+            print("User Cancelled")
+
+        # Create Save Path
+        self.save_path = gui.fileSaveDlg(initFileName=self.files['data'],
+                                         prompt='Select Save File'
+                                         )
+        if show_info[6] == 'Yes':
+            # Resume a crashed session (same date, time & name) from the
+            # next trial, with the trial list & layouts saved when the
+            # session started
+            design = np.load(self.files['design'])
+            self.triallist = design['triallist']
+            self.layouts = design['layouts']
+            self.first_trial = completed_trials(self.save_path)
+            if self.adaptive is not None:
+                self.adaptive.replay(self.save_path)
+            print("Resuming from Trial {}".format(self.first_trial + 1))
+        else:
+            # Record the trial list & every 9-patch layout before the
+            # first trial
+            np.savez(self.files['design'], triallist=self.triallist,
+                     layouts=self.layouts)
+            self.first_trial = 0
+        # orientations of the gabor set by position 1-9, saved with every
+        # trial
+        self.set_orientations_by_position = \
+            orientations_by_position(self.layouts).tolist()
+
+    def open_window(self, cue_fill_color='#C0C0C0', telemetry=None):
+        win = Session.open_window(self, cue_fill_color, telemetry)
+        self.break_stim = create_break_stimuli(win)
+        # the measured refresh rate the durations were converted with
+        write_calibration(self.files['calibration'], self.calibration,
+                          datetime.now().isoformat(timespec='seconds'))
+        return win
+
+
+def start_logging():
+    # clear command output and start logging
+    os.system('cls' if os.name == 'ht' else 'clear')
+    logging.console.setLevel(logging.CRITICAL)
+    print("**************************************")
+    print("MODIFIED SPERLING'S SINGLE-ENSEMBLE TASK")
+    print("PSYCHOPY LOGGING set to : CRITICAL")
+    print(datetime.now())
+    print("**************************************")
 
 
 def instruction():
@@ -171,281 +207,121 @@ For a small circle, report the orientation of the single patch; \n\
 For a big circle, report the average of all patches within. \n\n\
 Press 'f' to indicate an anti-clockwise tilt & \n\
 Press 'j' to indicate a clockwise tilt. \n\n\
-You are required to complete a total of 392 trials, optional or mandatory \
-breaks will be given for every 98 trials (~ 5 minutes).\
-The whole experimental procedure is expected to complete within 30 minutes.\n\n\
+You are required to complete a total of {} trials, optional or mandatory \
+breaks will be given after {}, {} & {} trials. \
+The whole experimental procedure is expected to complete within {} minutes.\n\n\
 Important Remarks: \n\
 Response ASAP, Stick to you Intuition, & Prevent Overthinking. \n\
 Raise your questions now, if there is any. \n\n\
 Press 'f' or 'j' to Start the Experiment. \n\
 Press 'End' if you want to Terminate the Experiment anytime.\
-"
+".format(session.No_of_Trials, *[trial_no + 1 for trial_no in
+                                 session.breaktrial],
+         # 30 minutes for the 392 trials of the full design
+         math.ceil(30 * session.No_of_Trials / 392))
 
-    instruct = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+    instruct = visual.TextStim(win = session.win, text = ' ',
+                               font = 'Times New Roman',
                                pos = (0,0), color = 'black', units = 'deg',
                                height = 0.9, wrapWidth=26
                                )
     instruct.setText(instruct_text)
     instruct.draw()
-    win.flip()
+    session.win.flip()
     instructresp = event.waitKeys(maxWait=1000, keyList=['end','f', 'j'],
                                   clearEvents=True
                                   )
     if 'f' in instructresp or 'j' in instructresp:
         pass
     elif 'end' in instructresp:
-        win.close()
+        session.win.close()
         sys.exit()
 
 
-def fixation():
-    # creating and drawing fixation cross to memeory
-    fix_hori = visual.Rect(win = win, width=0.9, height=0.1, units='deg',
-                           lineColor='black', fillColor='black', pos=(0,0)
-                           )
-    fix_vert = visual.Rect(win = win, width=0.1, height=0.9, units='deg',
-                           lineColor='black', fillColor='black', pos=(0,0)
-                           )
-    fix_hori.draw()
-    fix_vert.draw()
-
-
-def pos_to_coordinate(position):
-    '''
-    Dictionary to convert position code to coordinates,
-    Position Code Refer below
-    (1,2,3)
-    (4,5,6)
-    (7,8,9)
-    '''
-    return {1: (-1.4142, 1.4142),
-            2: (0, 2),
-            3: (1.4142, 1.4142),
-            4: (-2, 0),
-            5: (0,0),
-            6: (2, 0),
-            7: (-1.4142, -1.4142),
-            8: (0, -2),
-            9: (1.4142, -1.4142)}.get(position)
-
-
-def precue(condition, position):
-    """
-    Creating and drawing the pre-cue circle to memory
-    Condition 1 = single pre-cue congruent trial
-    Condition 2 = single pre-cue incongruent trial
-    Condition 3 = ensemble pre-cue congruent trial
-    Condition 4 = ensemble pre-cue incongruent trial
-    #
-    Condition 1 & 2 --> Return single pre-cue
-    Condition 3 & 4 --> Return ensemble pre-cue
-    """
-    singleprecue = visual.Circle(win=win, units = 'deg', radius=0.9,
-                                 edges=1000, fillColor='#C0C0C0',
-                                 lineColor='black',
-                                 lineWidth=line_width_in_pixel, opacity=1
-                                 )
-    setprecue = visual.Circle(win=win, units = 'deg', pos=(0,0), radius=2.85,
-                              edges=1000, fillColor='#C0C0C0',
-                              lineColor='black',
-                              lineWidth=line_width_in_pixel, opacity=1
-                              )
-
-    if (condition == 1 or condition == 2):
-        singleprecue.pos = pos_to_coordinate(position)
-        singleprecue.draw()
-    elif (condition == 3 or condition == 4):
-        setprecue.draw()
-
-
-def gaborset(set_orientation, cued_orientation, position):
-    '''
-    creating the 9-gabor set, one central grating surrounded by
-    8 flanker gratings, use pos_to_coordinate dict to convert
-    only draw the set to memory
-    '''
-    grating = visual.GratingStim(win = win, units= 'deg',tex='sin',
-                                 mask='gauss', ori=0, pos=(0, 0),
-                                 size=(1.6,1.6), sf=3, opacity = 1,
-                                 blendmode='avg', texRes=128,
-                                 interpolate=True, depth=0.0
-                                 )
-    '''
-    Construction of the GaborSet Arrays
-    And Randomly Shuffle it
-    '''
-
-    pos_array = [1,2,3,4,5,6,7,8,9]
-    np.random.shuffle(pos_array)
-
-    ori_array = []
-    pos_ori_array = np.array([5,10,15])
-    neg_ori_array = -pos_ori_array
+def countdown_text(timer):
+    return '{:.1f}'.format(max(0.0, timer.getTime()))
 
-    if set_orientation > 0:  # postive ensemble set
-        pos_ori_array = pos_ori_array + 2 * set_orientation
-        neg_ori_array = neg_ori_array + set_orientation
-    elif set_orientation < 0:  # negative ensemble set
-        pos_ori_array = pos_ori_array + set_orientation
-        neg_ori_array = neg_ori_array + 2 * set_orientation
-    else:  # neutral set (0)
-        pass
-
-    if cued_orientation == 0:  # To prevent 3 0s when the cued is 0
-        ori_array = [0,
-                     cued_orientation + 15,
-                     -cued_orientation - 15,
-                     pos_ori_array[0],
-                     pos_ori_array[1],
-                     pos_ori_array[2],
-                     neg_ori_array[0],
-                     neg_ori_array[1],
-                     neg_ori_array[2],
-                     ]
-
-    else:
-        ori_array = [0,
-                     cued_orientation,
-                     -cued_orientation,
-                     pos_ori_array[0],
-                     pos_ori_array[1],
-                     pos_ori_array[2],
-                     neg_ori_array[0],
-                     neg_ori_array[1],
-                     neg_ori_array[2],
-                     ]
-
-    np.random.shuffle(ori_array)
-    ori_array_list_to_string = ','.join([str(element) for element in ori_array])
-    backup_file.write(ori_array_list_to_string)
-    backup_file.write("\n")
 
+def countdown(break_text, break_timer, timer, keyList):
     '''
-    Draw the Cued_Orientation and Set position to memory,
-    remove the element in the array by value
+    Show the break screen until the timer ends or a key of keyList is
+    pressed, return the key (None if the time is up)
+    The countdown is only re-rendered & flipped when its displayed value
+    changes, in between the CPU sleeps and the background keyboard is
+    polled for the keys
     '''
-    grating.setOri(cued_orientation)
-    grating.pos = pos_to_coordinate(position)
-    grating.draw()
-    pos_array.remove(position)
-    ori_array.remove(cued_orientation)
+    session.responses.keyboard.clearEvents()
+    shown = None
+    while timer.getTime() > 0:
+        text = countdown_text(timer)
+        if text != shown:
+            break_timer.setText(text)
+            break_text.draw()
+            break_timer.draw()
+            session.win.flip()
+            shown = text
+        keys = session.responses.keyboard.getKeys(keyList=keyList,
+                                                  waitRelease=False)
+        if keys:
+            return keys[0].name
+        core.wait(session.config['break_poll_time'], hogCPUperiod=0)
+    return None
 
-    '''
-    this for-loop will set position & orientation from the arrays,
-    draw it to memory, and remove drawn element from the arrays
-    '''
-    for z in range(8):
-        grating.pos = pos_to_coordinate(pos_array[0])
-        grating.setOri(ori_array[0])
-        grating.draw()
-        del(pos_array[0])
-        del(ori_array[0])
-
-
-def postcue(condition, position):
-    """
-    Creating and drawing the post-cue circle to memory
-    Condition 1 = single pre-cue congruent trial
-    Condition 2 = single pre-cue incongruent trial
-    Condition 3 = ensemble pre-cue congruent trial
-    Condition 4 = ensemble pre-cue incongruent trial
-    #
-    Condition 1 & 4--> Return single post-cue
-    Condition 2 & 3 --> Return ensemble post-cue
-    """
-
-    singlepostcue = visual.Circle(win=win, units = 'deg', radius=0.9,
-                                  edges=1000, fillColor='#C0C0C0',
-                                  lineColor='black',
-                                  lineWidth=line_width_in_pixel,
-                                  opacity=1
-                                  )
-    setpostcue = visual.Circle(win=win, units = 'deg', pos=(0,0), radius=2.85,
-                               edges=1000, fillColor='#C0C0C0',
-                               lineColor='black',
-                               lineWidth=line_width_in_pixel,
-                               opacity=1
-                               )
 
-    if (condition == 1 or condition == 4):
-        singlepostcue.pos = pos_to_coordinate(position)
-        singlepostcue.draw()
-    elif (condition == 2 or condition == 3):
-        setpostcue.draw()
+def break_length(seconds):
+    # e.g. '1-minute' for 60 s, '45-second' for 45 s
+    if seconds >= 60 and seconds % 60 == 0:
+        return '{:g}-minute'.format(seconds / 60)
+    return '{:g}-second'.format(seconds)
 
 
 def break_time(trial_no):
     # Create stimuli and actions in break trials
     may_break_text = \
         "\
-You have completed {} trials, you may take a 1-minute break, \n\n\
+You have completed {} trials, you may take a {} break, \n\n\
 If you don't need to, \n\
 Press 'Spacebar' to Skip. \n\
-".format(trial_no + 1)
+".format(trial_no + 1, break_length(session.config['short_break_time']))
     must_break_text = \
         "\
-You have completed {} trials, Take a 2-minute break.\
-".format(trial_no + 1)
+You have completed {} trials, Take a {} break.\
+".format(trial_no + 1, break_length(session.config['long_break_time']))
     end_break_text = \
         "\
 Break Ended, \nPress 'f' or 'j' to Continue the experiment.\
 "
 
-    break_text = visual.TextStim(win = win, text = ' ',
-                                 font = 'Times New Roman',
-                                 pos = (0,-8), color = 'black',
-                                 units = 'deg', height = 0.9,
-                                 wrapWidth=20
-                                 )
-    break_timer = visual.TextStim(win = win, text = ' ',
-                                  font = 'Source Code Pro',
-                                  pos = (0,0), color = 'black',
-                                  units = 'deg', height = 4,
-                                  wrapWidth=20
-                                  )
+    break_text = session.break_stim['break_text']
+    break_timer = session.break_stim['break_timer']
 
-    if trial_no == breaktrial[1]:  # Must break
+    if trial_no == session.breaktrial[1]:  # Must break
         break_text.setText(must_break_text)
-        break_text.draw()
-        win.flip()
-        timer = core.CountdownTimer(long_break_time)
-        while timer.getTime() > 0:
-            break_timer.setText(round(timer.getTime(), 1))
-            break_text.draw()
-            break_timer.draw()
-            win.flip()
-            if event.getKeys(['end']):
-                win.close()
-                sys.exit()
+        timer = core.CountdownTimer(session.config['long_break_time'])
+        if countdown(break_text, break_timer, timer, ['end']) == 'end':
+            session.win.close()
+            sys.exit()
 
     else:  # Self-Terminated Break
         break_text.setText(may_break_text)
-        break_text.draw()
-        win.flip()
-        timer = core.CountdownTimer(short_break_time)
-        while timer.getTime() > 0:
-            break_timer.setText(round(timer.getTime(), 1))
-            break_text.draw()
-            break_timer.draw()
-            win.flip()
-            if event.getKeys(['space']):
-                break
-            elif event.getKeys(['end']):
-                win.close()
-                sys.exit()
+        timer = core.CountdownTimer(session.config['short_break_time'])
+        if countdown(break_text, break_timer, timer,
+                     ['space', 'end']) == 'end':
+            session.win.close()
+            sys.exit()
 
     break_text.setText(end_break_text)
-    break_timer.setText(round(timer.getTime(), 1))
+    break_timer.setText(countdown_text(timer))
     break_text.draw()
     break_timer.draw()
-    win.flip()
+    session.win.flip()
     breakresp = event.waitKeys(maxWait=1000, keyList=['end','f', 'j'],
                                clearEvents=True
                                )
     if 'f' in breakresp or 'j' in breakresp:
         pass
     elif 'end' in breakresp:
-        win.close()
+        session.win.close()
         sys.exit()
 
 
@@ -457,110 +333,116 @@ That's the End of the Experiment.\n\
 Thank you for your Participation.\
 "
 
-    debrief = visual.TextStim(win = win, text = ' ', font = 'Times New Roman',
+    debrief = visual.TextStim(win = session.win, text = ' ',
+                              font = 'Times New Roman',
                               pos = (0,0), color = 'black', units = 'deg',
                               height = 0.9, wrapWidth=20
                               )
     debrief.setText(debrief_text)
     debrief.draw()
-    win.flip()
+    session.win.flip()
     core.wait(5)
 
 
-def main():
+def trial_row(trial_no, response, latency):
+    # one row of the output data file, with the orientations of the set
+    triallist = session.triallist
+    return session.show_info[0:6] + [trial_no + 1,
+                                     triallist[trial_no][0],
+                                     triallist[trial_no][2],
+                                     triallist[trial_no][1],
+                                     triallist[trial_no][3],
+                                     response,
+                                     latency] + \
+        session.set_orientations_by_position[trial_no]
+
+
+def main(config=None):
+    '''
+    Run a whole experiment session
+    config = validated profile, from the command line if None
+    '''
+    global session
+    session = ExperimentSession(config)
+    start_logging()
+    session.ask_observer()
+    session.open_window(cue_fill_color='#C0C0C0',
+                        telemetry=TelemetryBuffer()
+                        if session.config['record_telemetry'] else None)
+    scheduler = session.scheduler
+    triallist = session.triallist
+    layouts = session.layouts
+    adaptive = session.adaptive
+    files = session.files
+
     instruction()
     '''
-    This is the main trial loop
+    Every trial is written to the data file as soon as it ends, by the
+    background I/O worker while the ISI is on the screen.
+    When the experiment is terminated in a break the worker first writes
+    the queued rows (atexit runs in reverse order), then the writer closes
+    '''
+    writer = TrialWriter(session.save_path)
+    atexit.register(writer.close)
+    if scheduler.telemetry is not None:
+        atexit.register(scheduler.telemetry.flush, files['telemetry'])
+    io_worker = IOWorker()
+    atexit.register(io_worker.close)
+
+    def adaptive_trial(i):
+        # judged orientation & 9-patch layout of the adaptive trial
+        triallist[i] = adaptive.next_trial(triallist[i])
+        layouts[i] = build_layouts(triallist[i:i + 1])[0]
+        session.set_orientations_by_position[i] = \
+            orientations_by_position(layouts[i:i + 1])[0].tolist()
+
+    def save_trial(i, trial, resp, resp_time):
+        io_worker.submit(writer.write_row, trial_row(i, resp, resp_time))
+        if adaptive is not None:
+            adaptive.update(trial, resp)
+        if scheduler.telemetry is not None:
+            io_worker.submit(write_records, files['telemetry'],
+                             scheduler.telemetry.take())
+
+    def take_break(i):
+        if i in session.breaktrial:
+            # save the data & timing so far during the break
+            scheduler.end_screen()
+            io_worker.submit(writer.sync)
+            if scheduler.telemetry is not None:
+                io_worker.submit(write_records, files['telemetry'],
+                                 scheduler.telemetry.take())
+            break_time(i)
+    '''
+    This is the main trial loop (see engine.py), 'end' stops it
     '''
-    for i in range(0, No_of_Trials):
-        '''Write data into dataframe for save '''
-        date_array.append(show_info[0])
-        time_array.append(show_info[1])
-        name_array.append(show_info[2])
-        age_array.append(show_info[3])
-        gender_array.append(show_info[4])
-        hand_array.append(show_info[5])
-        trial_no_array.append(i + 1)
-        condition_array.append(triallist[i][0])
-        set_orientation_array.append(triallist[i][1])
-        cued_orientation_array.append(triallist[i][2])
-        position_array.append(triallist[i][3])
-
-        # fixation screen
-        fixation()
-        win.flip()
-        core.wait(fixation_time)
-        # precue screen
-        precue(triallist[i][0], triallist[i][3])
-        win.flip()
-        core.wait(precue_time)
-        # set screen
-        gaborset(triallist[i][1], triallist[i][2], triallist[i][3])
-        win.flip()
-        core.wait(gaborset_time)
-        # blankscreen
-        win.flip()
-        core.wait(blankscreen_time)
-        # postcue screen
-        postcue(triallist[i][0], triallist[i][3])
-        win.flip()
-
-        start_time = core.getTime(applyZero = True)
-        resp = event.waitKeys(maxWait=1000, keyList=['end','f','j'],
-                              clearEvents=True)
-
-        if 'end' in resp:
-            # Exit Key
-            resp_time = core.getTime(applyZero = True) - start_time
-            response_array.append(resp[0])
-            latency_array.append(resp_time)
-            break
-
-        elif 'f' in resp:
-            # Anticlockwise response)
-            resp_time = core.getTime(applyZero = True) - start_time
-            response_array.append(resp[0])
-            latency_array.append(resp_time)
-            win.flip()
-            core.wait(isi_time)
-            if i in breaktrial:
-                break_time(i)
-                continue
-
-        elif 'j' in resp:
-            # Clockwise response
-            resp_time = core.getTime(applyZero = True) - start_time
-            response_array.append(resp[0])
-            latency_array.append(resp_time)
-            win.flip()
-            core.wait(isi_time)
-            if i in breaktrial:
-                break_time(i)
-                continue
+    TrialEngine(session, 'test').run(
+        session.first_trial, session.No_of_Trials,
+        before_trial=adaptive_trial if adaptive is not None else None,
+        after_response=save_trial, after_trial=take_break)
     '''
     The main trial loop Ends Here.
     '''
 
-    # Create the DataFrame & Save it to csv
-    outputfile = pd.DataFrame({'Exp_Date': date_array,
-                               'Exp_Time': time_array,
-                               'Sub_Name': name_array,
-                               'Age': age_array,
-                               'Gender': gender_array,
-                               'Dominant_Hand': hand_array,
-                               'Trial_No': trial_no_array,
-                               'Condition': condition_array,
-                               'Cued_Orientation': cued_orientation_array,
-                               'Set_Orientation': set_orientation_array,
-                               'Position': position_array,
-                               'Response': response_array,
-                               'Latency': latency_array
-                               })
-    outputfile.to_csv(save_path, sep=',', index=False)
-    # Debrifing & close all
+    # Write the remaining rows to disk & close the data file,
+    # then save a compact columnar copy for the cohort analyses
+    io_worker.submit(writer.close)
+    io_worker.submit(write_columnar, session.save_path, files['columnar'])
+    # Save every flip time to check the timing of the session
+    scheduler.end_screen()
+    io_worker.submit(write_flip_log, files['flips'],
+                     list(scheduler.flip_log))
+    if scheduler.telemetry is not None:
+        io_worker.submit(write_records, files['telemetry'],
+                         scheduler.telemetry.take())
+    if adaptive is not None:
+        io_worker.submit(write_estimates, files['staircase'],
+                         adaptive.estimates())
+    print("Dropped Frames: {}".format(scheduler.dropped_frames()))
+    # Debrifing & close all, the files are written meanwhile
     debriefing()
-    win.close()
-    backup_file.close()
+    io_worker.close()
+    session.close()
     sys.exit()
 
 